@@ -0,0 +1,175 @@
+# Admission control for the inference routes.
+#
+# The sync Farida handlers all run on one shared threadpool, so a burst on
+# one route would otherwise queue without bound behind it and slow down every
+# other request, health checks included. Each route group in ROUTE_GROUPS
+# runs at most `limit` requests at a time; up to `queue` more wait (for at most
+# FARIDA_ADMISSION_WAIT_SECONDS) and anything beyond that is turned away at
+# once with 503 and Retry-After, before its body is read. Routes outside the
+# groups (/wakeUp, /metrics, /admin/..., /debug/...) are never limited.
+#
+#   FARIDA_ADMISSION_LIMIT / FARIDA_ADMISSION_QUEUE        defaults for every group
+#   FARIDA_ADMISSION_<GROUP>_LIMIT / ..._<GROUP>_QUEUE     per group (0 limit = off)
+
+import asyncio
+import os
+import time
+import weakref
+from collections import deque
+
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+
+from metrics import Counter, Gauge, Histogram, REQUESTS
+from wireFormat import NegotiatedRoute
+
+# group: path prefixes it covers. A streamed response (/predict/ndjson) holds
+# its slot until the stream ends, since its scoring runs while it streams.
+ROUTE_GROUPS = {
+    "ovulation": ("/farida-ovulation-api",),
+    "pregnancy": ("/farida-pregnancy-api",),
+    "childcare": ("/farida-childcare-api",),
+    "budget": ("/predict",),
+}
+# 4 groups x 8 stays under the 40 threads of the default threadpool, leaving
+# threads free for the exempt routes
+DEFAULT_LIMIT = int(os.getenv("FARIDA_ADMISSION_LIMIT", "8"))
+DEFAULT_QUEUE = int(os.getenv("FARIDA_ADMISSION_QUEUE", "32"))
+WAIT_SECONDS = float(os.getenv("FARIDA_ADMISSION_WAIT_SECONDS", "2"))
+RETRY_AFTER_SECONDS = int(os.getenv("FARIDA_ADMISSION_RETRY_AFTER", "1"))
+
+ADMISSION_ACTIVE = Gauge("farida_admission_active", "Admitted requests running", ("group",))
+ADMISSION_QUEUED = Gauge("farida_admission_queue_depth", "Requests waiting for admission", ("group",))
+ADMISSION_SHED = Counter("farida_admission_shed_total", "Requests turned away with 503", ("group", "reason"))
+ADMISSION_WAIT_SECONDS = Histogram("farida_admission_wait_seconds", "Time spent waiting for admission", ("group",))
+
+class AdmissionGate:
+    # Counting semaphore with a bounded FIFO of waiters. Only ever touched
+    # from the event loop, so it needs no lock.
+    def __init__(self, group: str, limit: int, queue: int):
+        self.group = group
+        self.limit = limit
+        self.queue = queue
+        self.active = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        # None when admitted, else the reason the request is shed
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            ADMISSION_ACTIVE.inc(self.group)
+            return None
+        if len(self._waiters) >= self.queue:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.inc(self.group)
+        start = time.perf_counter()
+        try:
+            # release() hands its slot straight to the waiter
+            await asyncio.wait_for(waiter, WAIT_SECONDS)
+            return None
+        except asyncio.TimeoutError:
+            return "timeout"
+        except asyncio.CancelledError:
+            # Client went away; pass on a slot handed over in the meantime
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            ADMISSION_QUEUED.dec(self.group)
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, self.group)
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        ADMISSION_ACTIVE.dec(self.group)
+
+    def status(self) -> dict:
+        return {"limit": self.limit, "queue": self.queue, "active": self.active, "waiting": len(self._waiters)}
+
+class StreamSlot:
+    # An admission slot handed on to a streamed response; released once,
+    # whichever of held_stream() or the response's finalizer gets there first
+    def __init__(self, gate: AdmissionGate):
+        self.gate = gate
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.gate.release()
+
+async def held_stream(chunks, slot: StreamSlot):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        slot.release()
+
+def group_setting(group: str, name: str, default: int) -> int:
+    return int(os.getenv(f"FARIDA_ADMISSION_{group.upper()}_{name}", default))
+
+GATES = {
+    group: AdmissionGate(group, group_setting(group, "LIMIT", DEFAULT_LIMIT), group_setting(group, "QUEUE", DEFAULT_QUEUE))
+    for group in ROUTE_GROUPS
+}
+
+def gate_for(path: str):
+    for group, prefixes in ROUTE_GROUPS.items():
+        if any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes):
+            gate = GATES[group]
+            return gate if gate.limit > 0 else None
+    return None
+
+def admission_status() -> dict:
+    return {group: gate.status() for group, gate in GATES.items()}
+
+class AdmittedRoute(NegotiatedRoute):
+    def get_route_handler(self):
+        handler = self.get_admitted_handler()
+        gate = gate_for(self.path)
+        if gate is None:
+            return handler
+        method = ",".join(sorted(self.methods or ()))
+
+        async def admitted_handler(request: Request):
+            reason = await gate.acquire()
+            if reason is not None:
+                ADMISSION_SHED.inc(gate.group, reason)
+                REQUESTS.inc(self.path, method, 503)
+                return JSONResponse(
+                    status_code=503,
+                    content={"detail": "Server busy, retry later"},
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+                )
+            try:
+                response = await handler(request)
+            except BaseException:
+                gate.release()
+                raise
+            if not hasattr(response, "body_iterator"):
+                gate.release()
+                return response
+
+            slot = StreamSlot(gate)
+            response.body_iterator = held_stream(response.body_iterator, slot)
+            # A stream that is never iterated (the client left before it
+            # started) never runs held_stream's finally
+            weakref.finalize(response, slot.release).atexit = False
+            return response
+
+        return admitted_handler
+
+    def get_admitted_handler(self):
+        # What runs once a request is admitted. Layers that read the body
+        # (singleFlight.py, etags.py) wrap this rather than get_route_handler,
+        # so a shed request is turned away before its body is read.
+        return super().get_route_handler()
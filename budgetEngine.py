@@ -0,0 +1,322 @@
+# Columnar scoring engine for the budget /predict route.
+#
+# All numeric work for a request (percentage spent, band, highest expense per
+# budget) is done in NumPy across every budget at once; strings are only
+# rendered at the end. The tip templates are built once at import.
+#
+# In analytics mode (/predict?analytics=true) each budget also gets its top-k
+# expenses, spending percentiles and how concentrated its spending is by
+# category (expense name). These come from one selection pass over the
+# budget's slice of the amounts column, so they stay O(n) in the number of
+# expenses however large a budget gets.
+
+from itertools import chain
+from operator import attrgetter
+
+import numpy as np
+
+from hintPicker import HintPicker
+from metrics import stage
+
+# Tip templates
+OVER_BUDGET_TITLES = [
+    "You've Gone Over Your Budget—Time to Reassess Your Spending Habits",
+    "Budget Limit Exceeded: It's Crucial to Make Immediate Adjustments",
+    "Your Spending Has Surpassed Safe Levels—Take Preventive Action Now",
+    "Oops! You've Exceeded Your Budget—Consider Revisiting Your Financial Plan",
+    "Budget Status: Over the Threshold—Urgent Attention Needed",
+    "Warning: Your Financial Activity Has Pushed You Into the Red Zone",
+    "Alert: Current Spending Patterns Have Breached Your Budget Cap",
+    "Budget Violation Detected—A Strategic Review Is Strongly Advised",
+    "Heads-Up! You're Spending More Than You Planned—Act Now to Regain Control",
+    "High Spending Alert: It Looks Like You've Gone Over Your Intended Budget"
+]
+
+OVER_BUDGET_DESCS = [
+    "Your expenses have exceeded the limits you previously set. It might be a good time to review your discretionary spending and find areas where you can cut back.",
+    "It appears that you're spending more than anticipated. Consider reevaluating your monthly expenses to identify what can be reduced or postponed.",
+    "Your current spending habits are pushing your budget beyond its capacity. Trimming down non-essential purchases could help you regain financial control.",
+    "Your budget has been exceeded, which may impact your financial goals. A quick review and adjustment of your spending plan is highly recommended.",
+    "Spending is running higher than planned. This could affect savings or other financial goals, so look for areas where you can save.",
+    "You've crossed your financial boundaries for the period. Tightening your spending on luxuries or optional services could help rebalance your budget.",
+    "You've passed your set limit, suggesting that you might need to prioritize your essential expenses over discretionary ones for the rest of the period.",
+    "This level of spending may lead to long-term budget imbalances. A deep dive into your expenditures might reveal ways to trim unnecessary costs.",
+    "You've spent more than your planned budget allows. Reallocating funds and adjusting upcoming expenses could help steer things back on track.",
+    "Your spending trends suggest a budget overrun. Consider using tools or alerts to stay more closely aligned with your financial goals moving forward."
+]
+
+WARNING_TITLES = [
+    "Budget Caution: You're Halfway Through Your Limit—Time for Careful Monitoring",
+    "Spending Alert: You've Reached the Midpoint of Your Budget—Stay Aware",
+    "Approaching Your Spending Limit—It's Wise to Stay Vigilant",
+    "Heads Up! Your Budget Usage Has Crossed the 50% Mark",
+    "Caution: You're on a Steady Spending Trajectory—Monitor Closely",
+    "Budget Check-In: You're at the Halfway Point—Consider Reevaluating",
+    "You're on Track But Getting Close—Stay Alert to Avoid Overruns",
+    "Budget Utilization Is Rising—Maintain Smart and Conscious Spending",
+    "Halfway There Financially—It's a Good Time for a Midpoint Review",
+    "Spending is Stable for Now, but Keep a Watchful Eye on What's Next"
+]
+
+WARNING_DESCS = [
+    "You're at a critical point where you've used about half of your allocated budget. It's a good time to pause and assess how you're allocating your remaining funds.",
+    "Your spending is currently moderate, but you're halfway to your limit. Consider reducing any planned non-essential purchases.",
+    "You're doing okay, but it's important to think ahead. If spending continues at this rate, you might exceed your budget by the end of the cycle.",
+    "At this halfway milestone, taking a moment to plan your remaining budget could help you stay within bounds.",
+    "Your financial habits are steady so far, but it's wise to keep a watchful eye and avoid unnecessary splurges.",
+    "You've spent about half of your budget already. Try to project what remaining expenses might look like and plan accordingly.",
+    "Still on track, but now is the perfect time for a spending check-in. Make adjustments if necessary to avoid overspending.",
+    "Your current pace is fine, but keep a close eye on recurring or unexpected expenses that might push you over the line.",
+    "Spending is approaching a more sensitive range. Keeping a tighter grip now can help avoid surprises later.",
+    "It's not urgent yet, but reviewing your financial priorities now can go a long way in ensuring a smooth rest of the month."
+]
+
+WITHIN_BUDGET_TITLES = [
+    "Congratulations! You're Currently Operating Well Within Your Budget",
+    "All Systems Go: Your Spending Is Fully Under Control and On Track",
+    "Excellent Work Staying Within Budget—You're Managing Finances Like a Pro",
+    "Great News: Your Budget Is Healthy and Spending Is Well Balanced",
+    "You're On Target Financially—Keep Up the Good Work!",
+    "All Clear: Your Current Budget Is Balanced and Functioning Smoothly",
+    "Spending Check Complete—Your Budget Is in Great Shape",
+    "Smart Financial Habits Detected—You're Spending Responsibly",
+    "Financial Status: Healthy and Sustainable Spending in Progress",
+    "Nice Budgeting! Everything Is Aligned With Your Financial Goals"
+]
+
+WITHIN_BUDGET_DESCS = [
+    "You're doing a great job of keeping your expenses within your planned budget. Maintaining this pace will help you build long-term financial stability.",
+    "Your current financial behavior shows excellent budgeting discipline. Keep it up, and you'll likely reach your savings goals with ease.",
+    "You've demonstrated strong control over your spending. Staying consistent will help you avoid last-minute budget surprises.",
+    "Everything looks great—your financial plan is working exactly as intended. Continue with your current habits for ongoing success.",
+    "You're managing your finances well, which means you're in a good place to either save more or invest in something meaningful.",
+    "Well done! You're not only staying within your limits but also showing that you're making smart, conscious financial decisions.",
+    "Your spending aligns perfectly with your plan. This level of control will serve you well in both the short and long term.",
+    "You've made sound financial decisions this period. Staying within your budget keeps things stress-free and predictable.",
+    "This is a great example of healthy budgeting. If you continue this trend, you're setting yourself up for financial resilience.",
+    "You're doing everything right financially—keep tracking your progress, and success will follow."
+]
+
+# Expense detail phrases
+EXPENSE_PHRASES = [
+    " Your largest recorded expense for this budget cycle was '{name}', which amounted to a significant total of {amount:,}Tsh. This single item had the biggest impact on your overall spending.",
+    " The most substantial financial outlay this period came from '{name}', costing you {amount:,}Tsh. It's a good idea to review this item if you're looking to cut down expenses.",
+    " Your top expenditure was the item '{name}', setting you back {amount:,}Tsh. As your biggest cost, it might be worth examining its necessity or frequency.",
+    " You spent a notable {amount:,}Tsh on '{name}', making it your highest single expense during this budgeting period. Consider whether similar costs are essential in the future.",
+    " The standout expense in this budgeting cycle was '{name}', which totaled {amount:,}Tsh. This item contributed the most to your overall spending this time around."
+]
+
+# Band codes, in the order the route checks them
+WITHIN_BUDGET, WARNING, OVER_BUDGET = 0, 1, 2
+
+BAND_TEMPLATES = {
+    OVER_BUDGET: (OVER_BUDGET_TITLES, OVER_BUDGET_DESCS),
+    WARNING: (WARNING_TITLES, WARNING_DESCS),
+    WITHIN_BUDGET: (WITHIN_BUDGET_TITLES, WITHIN_BUDGET_DESCS),
+}
+
+# ----------- Columnar scoring -----------
+
+def round2(values: np.ndarray) -> np.ndarray:
+    # np.round(x, 2) and Python's round(x, 2) only disagree when x * 100 lands
+    # next to .5; those few values are re-rounded the Python way
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+def percentage_spent(budgets: np.ndarray, spent: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(budgets != 0, spent / budgets, 0.0)
+    return np.where(budgets != 0, round2(ratio * 100), 0.0)
+
+def budget_bands(percentages: np.ndarray) -> np.ndarray:
+    bands = np.full(len(percentages), WITHIN_BUDGET, dtype=np.int8)
+    bands[(percentages > 50) & (percentages <= 75)] = WARNING
+    bands[percentages > 75] = OVER_BUDGET
+    return bands
+
+def highest_expense_index(amounts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Position (into the flattened amounts) of each budget's first largest
+    # expense, like max(..., key=...) picks it; -1 for budgets with no expenses
+    highest = np.full(len(counts), -1, dtype=np.int64)
+    nonempty = counts > 0
+    if not nonempty.any():
+        return highest
+
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    segment_max = np.zeros(len(counts), dtype=amounts.dtype)
+    segment_max[nonempty] = np.maximum.reduceat(amounts, starts[nonempty])
+
+    segment = np.repeat(np.arange(len(counts)), counts)
+    candidates = np.flatnonzero(amounts == segment_max[segment])
+    candidate_segment = segment[candidates]
+    first = np.concatenate([[True], candidate_segment[1:] != candidate_segment[:-1]])
+    highest[candidate_segment[first]] = candidates[first]
+    return highest
+
+def amount_column(expenses: list) -> np.ndarray:
+    # int64 normally; amounts outside its range (Expense.amount is any int)
+    # fall back to an object column of Python ints, which the same NumPy code
+    # handles, only slower
+    try:
+        return np.fromiter(map(attrgetter("amount"), expenses), dtype=np.int64, count=len(expenses))
+    except OverflowError:
+        return np.array([expense.amount for expense in expenses], dtype=object)
+
+def score_budgets(items, top_k: int = None) -> list:
+    # top_k: None for the plain tips, else the number of top expenses to
+    # report in each budget's analytics
+    # Column extraction from the parsed BudgetItem / Expense models
+    with stage("columns"):
+        expenses = list(chain.from_iterable(map(attrgetter("allExpenses"), items)))
+        columns = dict(
+            budget_ids=[item.budgetID for item in items],
+            budget_names=[item.budgetName for item in items],
+            budgets=np.fromiter(map(attrgetter("budgetAmount"), items), dtype=np.float64, count=len(items)),
+            spent=np.fromiter(map(attrgetter("expenseTotal"), items), dtype=np.float64, count=len(items)),
+            counts=np.fromiter((len(item.allExpenses) for item in items), dtype=np.int64, count=len(items)),
+            amounts=amount_column(expenses),
+            expense_names=lambda i: expenses[i].name,
+        )
+    return score_budget_columns(**columns, top_k=top_k)
+
+def score_budget_columns(budget_ids, budget_names, budgets, spent, counts, amounts, expense_names, top_k=None) -> list:
+    # One row per budget in budget_ids/budget_names/budgets/spent/counts;
+    # amounts holds every budget's expenses back to back, and
+    # expense_names(i) returns the name of the i-th of them
+    if len(budgets) == 0:
+        return []
+
+    with stage("score"):
+        percentages = percentage_spent(budgets, spent)
+        bands = budget_bands(percentages)
+        highest = highest_expense_index(amounts, counts)
+
+    with stage("hints"):
+        response = render_budgets(budget_ids, budget_names, budgets, percentages, bands, highest, amounts, expense_names)
+
+    if top_k is not None:
+        with stage("analytics"):
+            for row, analytics in zip(response, expense_analytics(counts, amounts, expense_names, top_k)):
+                row["analytics"] = analytics
+    return response
+
+# ----------- Expense analytics -----------
+
+ANALYTICS_TOP_K = 5
+MAX_ANALYTICS_TOP_K = 100
+PERCENTILES = (50, 90, 99)
+
+def expense_analytics(counts: np.ndarray, amounts: np.ndarray, expense_names, top_k: int) -> list:
+    analytics = []
+    start = 0
+    for count in counts.tolist():
+        analytics.append(budget_analytics(amounts[start:start + count], start, expense_names, top_k))
+        start += count
+    return analytics
+
+def budget_analytics(values: np.ndarray, offset: int, expense_names, top_k: int) -> dict:
+    # values is a view of one budget's amounts, which start at `offset` in
+    # the flattened column
+    count = len(values)
+    if count == 0:
+        return {
+            "expense_count": 0,
+            "top_expenses": [],
+            "percentiles": {f"p{q}": None for q in PERCENTILES},
+            "top_category": None,
+            "top_category_share": 0,
+            "category_concentration": 0,
+        }
+
+    # One partial sort gives every order statistic needed: the ranks either
+    # side of each percentile and the k-th largest amount
+    k = min(top_k, count)
+    ranks = np.array(PERCENTILES, dtype=np.float64) / 100 * (count - 1)
+    lower, upper = np.floor(ranks).astype(np.int64), np.ceil(ranks).astype(np.int64)
+    order = np.argpartition(values, np.unique(np.concatenate([lower, upper, [count - k]])))
+    percentiles = [None] * len(PERCENTILES)
+    with np.errstate(over="ignore"):
+        try:
+            ranked = values[order].astype(np.float64)
+            interpolated = round2(ranked[lower] + (ranked[upper] - ranked[lower]) * (ranks - lower))
+        except OverflowError:
+            interpolated = None
+    # Amounts past float range have no JSON number; their percentiles stay None
+    if interpolated is not None and np.isfinite(interpolated).all():
+        percentiles = interpolated.tolist()
+
+    top = top_expense_positions(values, order[count - k:], k)
+    names = [expense_names(offset + i) for i in range(count)]
+    top_category, share, concentration = category_concentration(names, values)
+    return {
+        "expense_count": count,
+        "top_expenses": [{"name": names[i], "amount": int(values[i])} for i in top.tolist()],
+        "percentiles": {f"p{q}": value for q, value in zip(PERCENTILES, percentiles)},
+        "top_category": top_category,
+        "top_category_share": share,
+        "category_concentration": concentration,
+    }
+
+def top_expense_positions(values: np.ndarray, largest: np.ndarray, k: int) -> np.ndarray:
+    # largest holds the positions of some k largest values, in no order.
+    # Amounts tied with the k-th largest are taken in their order in the
+    # budget, and the result is largest first, as a stable sort would list them.
+    threshold = values[largest].min()
+    above = largest[values[largest] > threshold]
+    if len(above) < k:
+        ties = np.flatnonzero(values == threshold)[:k - len(above)]
+        largest = np.sort(np.concatenate([above, ties]))
+    else:
+        largest = np.sort(above)
+    return largest[np.argsort(-values[largest], kind="stable")]
+
+def category_concentration(names: list, values: np.ndarray):
+    # (largest category, its percentage of spending, Herfindahl index of the
+    # category percentages: 10000 when one category takes everything).
+    # Negative amounts (refunds) count as no spending.
+    codes = {}
+    index = np.fromiter((codes.setdefault(name, len(codes)) for name in names), dtype=np.int64, count=len(names))
+    if values.dtype == object:
+        # Python ints past int64: sum them exactly rather than as floats
+        totals = np.zeros(len(codes), dtype=object)
+        np.add.at(totals, index, np.maximum(values, 0))
+    else:
+        totals = np.bincount(index, weights=np.maximum(values, 0), minlength=len(codes))
+    total = totals.sum()
+    if total <= 0:
+        return None, 0, 0
+    shares = totals / total * 100
+    top = int(np.argmax(shares))
+    return list(codes)[top], round(float(shares[top]), 2), round(float(np.dot(shares, shares)), 2)
+
+# ----------- Rendering -----------
+
+def render_budgets(budget_ids, budget_names, budgets, percentages, bands, highest, amounts, expense_names) -> list:
+    response = []
+    for budget_id, budget_name, budget, percentage, band, highest_at in zip(
+        budget_ids, budget_names, budgets.tolist(), percentages.tolist(), bands.tolist(), highest.tolist()
+    ):
+        # Expense details
+        highest_expense = (expense_names(highest_at), int(amounts[highest_at])) if highest_at >= 0 else None
+        picker = HintPicker("budget", budget_id, budget_name, budget, percentage, highest_expense)
+        if highest_expense is not None:
+            phrase = picker.choice(EXPENSE_PHRASES)
+            expense_desc = phrase.format(name=highest_expense[0], amount=highest_expense[1])
+        else:
+            expense_desc = ""
+
+        titles, descs = BAND_TEMPLATES[band]
+        response.append({
+            "budgetID": budget_id,
+            "budgetName": budget_name,
+            "tip_title": picker.choice(titles),
+            "tip_desc": picker.choice(descs) + expense_desc,
+            "over_budget": band == OVER_BUDGET,
+            "percentage_spent": percentage if budget else 0,
+        })
+
+    return response
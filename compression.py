@@ -0,0 +1,281 @@
+# gzip / brotli compression of request and response bodies.
+#
+# Clients on slow links can upload their history arrays compressed, with
+# Content-Encoding: gzip, deflate or br, and are sent compressed responses
+# when their Accept-Encoding allows it (br preferred, then gzip). Responses
+# smaller than FARIDA_COMPRESSION_MIN_BYTES are sent as they are, since
+# compressing them costs more CPU than the bytes are worth; streamed
+# responses (NDJSON) are compressed chunk by chunk and flushed after each one.
+# Brotli is used when the `brotli` package is installed.
+#
+# Request bodies are decompressed chunk by chunk as they are received, about
+# DECOMPRESS_CHUNK_BYTES of output at a time, so /predict/ndjson
+# still streams in constant memory. Routes that buffer their body stop
+# reading at FARIDA_MAX_REQUEST_BYTES decompressed (413), which bounds what a
+# small compressed body can expand to; an unknown encoding is a 415 and a
+# corrupt or truncated body a 400.
+#
+# Applied to every route as ASGI middleware (see app.py).
+
+import os
+import time
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from metrics import Counter, Histogram
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = int(os.getenv("FARIDA_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("FARIDA_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("FARIDA_BROTLI_QUALITY", "4"))
+MAX_REQUEST_BYTES = int(os.getenv("FARIDA_MAX_REQUEST_BYTES", str(32 << 20)))
+DECOMPRESS_CHUNK_BYTES = 64 << 10
+# Routes that consume their body as a stream: decompressed without the size cap
+STREAMED_PATHS = ("/predict/ndjson",)
+
+GZIP = "gzip"
+BROTLI = "br"
+# Response encodings in order of preference
+RESPONSE_ENCODINGS = ([BROTLI] if brotli is not None else []) + [GZIP]
+REQUEST_ENCODINGS = {"gzip", "x-gzip", "deflate"} | ({BROTLI} if brotli is not None else set())
+
+# direction: "request" (decompressed) or "response" (compressed)
+COMPRESSION_SECONDS = Histogram(
+    "farida_compression_duration_seconds", "Time spent compressing or decompressing a body", ("direction", "encoding")
+)
+COMPRESSION_BYTES_SAVED = Counter(
+    "farida_compression_bytes_saved_total", "Uncompressed minus compressed body bytes", ("direction", "encoding")
+)
+COMPRESSION_SKIPPED = Counter(
+    "farida_compression_skipped_total", "Responses sent uncompressed to a client that accepts compression", ("reason",)
+)
+
+class BodyError(HTTPException):
+    # Raised from receive() while the app reads the body, and answered by
+    # its HTTPException handler like any other
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code=status_code, detail=detail)
+
+def accepted_encoding(accept_encoding: str):
+    # Best of RESPONSE_ENCODINGS the client accepts (q > 0), else None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    wildcard = accepted.get("*", 0.0)
+    candidates = [(accepted.get(coding, wildcard), -rank, coding) for rank, coding in enumerate(RESPONSE_ENCODINGS)]
+    q, _, coding = max(candidates)
+    return coding if q > 0 else None
+
+def compressor(encoding: str):
+    # (compress(chunk) -> bytes, flush(final) -> bytes)
+    if encoding == BROTLI:
+        state = brotli.Compressor(quality=BROTLI_QUALITY)
+        return state.process, lambda final: state.finish() if final else state.flush()
+    # wbits 31: gzip framing, with a zero mtime so equal bodies compress equally
+    state = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return state.compress, lambda final: state.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class Decompressor:
+    # Incremental decompression; pieces() yields the output of one input
+    # chunk in pieces of about DECOMPRESS_CHUNK_BYTES
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == BROTLI:
+            self._state = brotli.Decompressor()
+        else:
+            # deflate is zlib framing; wbits 47 takes gzip (or zlib) framing
+            self._state = zlib.decompressobj(15 if encoding == "deflate" else 47)
+
+    def pieces(self, data: bytes):
+        try:
+            if self.encoding == BROTLI:
+                # A full piece may leave output behind even once more input
+                # could be accepted, so drain with empty input until it runs dry
+                piece = self._state.process(data, output_buffer_limit=DECOMPRESS_CHUNK_BYTES)
+                yield piece
+                while not self._state.is_finished() and (
+                    len(piece) >= DECOMPRESS_CHUNK_BYTES or not self._state.can_accept_more_data()
+                ):
+                    piece = self._state.process(b"", output_buffer_limit=DECOMPRESS_CHUNK_BYTES)
+                    yield piece
+                return
+            while True:
+                piece = self._state.decompress(data, DECOMPRESS_CHUNK_BYTES)
+                data = self._state.unconsumed_tail
+                yield piece
+                if not data and len(piece) < DECOMPRESS_CHUNK_BYTES:
+                    return
+        except (zlib.error, *((brotli.error,) if brotli is not None else ())) as exc:
+            raise BodyError(400, f"Invalid {self.encoding} request body: {exc}")
+
+    def finish(self):
+        finished = self._state.is_finished() if self.encoding == BROTLI else self._state.eof
+        if not finished:
+            raise BodyError(400, f"Truncated {self.encoding} request body")
+
+class DecompressedReceive:
+    # Stands in for receive(): every http.request message is replaced by the
+    # decompressed pieces of its body
+    def __init__(self, receive, encoding: str, limit: int = None):
+        self._receive = receive
+        self.encoding = encoding
+        self.limit = limit
+        self._decompressor = Decompressor(encoding)
+        self._pieces = iter(())
+        self._more_body = True
+        self._done = False
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+        self.seconds = 0.0
+
+    async def __call__(self):
+        while not self._done:
+            start = time.perf_counter()
+            piece = next(self._pieces, None)
+            self.seconds += time.perf_counter() - start
+
+            if piece:
+                self.decompressed_bytes += len(piece)
+                if self.limit is not None and self.decompressed_bytes > self.limit:
+                    raise BodyError(413, f"Request body is larger than {self.limit} bytes once decompressed")
+                return {"type": "http.request", "body": piece, "more_body": True}
+            if piece is not None:
+                continue
+            if not self._more_body:
+                self._decompressor.finish()
+                self._done = True
+                self.record()
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            message = await self._receive()
+            if message["type"] != "http.request":
+                return message
+            body = message.get("body", b"")
+            self.compressed_bytes += len(body)
+            self._more_body = message.get("more_body", False)
+            self._pieces = self._decompressor.pieces(body)
+        # Past the end of the body (e.g. waiting for http.disconnect)
+        return await self._receive()
+
+    def record(self):
+        COMPRESSION_SECONDS.observe(self.seconds, "request", self.encoding)
+        COMPRESSION_BYTES_SAVED.inc(
+            "request", self.encoding, amount=self.decompressed_bytes - self.compressed_bytes
+        )
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding != "identity":
+            if content_encoding not in REQUEST_ENCODINGS:
+                detail = f"Unsupported Content-Encoding: {content_encoding}"
+                await JSONResponse({"detail": detail}, status_code=415)(scope, receive, send)
+                return
+            scope, receive = self.decompressed_request(scope, receive, content_encoding)
+
+        encoding = accepted_encoding(headers.get("accept-encoding", ""))
+        if scope["method"] == "HEAD":
+            encoding = None
+        await self.app(scope, receive, ResponseCompressor(send, encoding).send)
+
+    def decompressed_request(self, scope, receive, encoding: str):
+        limit = None if scope["path"] in STREAMED_PATHS else MAX_REQUEST_BYTES
+        headers = [
+            (name, value) for name, value in scope["headers"] if name not in (b"content-encoding", b"content-length")
+        ]
+        return {**scope, "headers": headers}, DecompressedReceive(receive, encoding, limit)
+
+class ResponseCompressor:
+    # Wraps `send` for one response; with no encoding it only adds the Vary header
+    def __init__(self, send, encoding: str = None):
+        self._send = send
+        self.encoding = encoding
+        self.start_message = None
+        self.stream = None
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            reason = self.skip_reason(start, headers, body, more_body)
+            if reason is not None:
+                if self.encoding is not None:
+                    COMPRESSION_SKIPPED.inc(reason)
+                await self._send(start)
+                await self._send(message)
+                return
+
+            self.stream = compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            etag = headers.get("etag")
+            if etag is not None and etag.endswith('"') and not etag.startswith("W/"):
+                # A strong tag names exact bytes, so each encoding gets its own
+                headers["ETag"] = f'{etag[:-1]}-{self.encoding}"'
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                compressed = self.compress(body, final=True)
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(start)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            await self._send(start)
+
+        if self.stream is None:
+            await self._send(message)
+            return
+        await self._send({
+            "type": "http.response.body", "body": self.compress(body, final=not more_body), "more_body": more_body,
+        })
+
+    def skip_reason(self, start, headers: MutableHeaders, body: bytes, more_body: bool):
+        if self.encoding is None:
+            return "not_accepted"
+        if "content-encoding" in headers:
+            return "already_encoded"
+        if start["status"] in (204, 304):
+            return "no_content"
+        if not more_body and len(body) < MIN_COMPRESS_BYTES:
+            return "below_threshold"
+        return None
+
+    def compress(self, body: bytes, final: bool) -> bytes:
+        process, flush = self.stream
+        start = time.perf_counter()
+        compressed = process(body) + flush(final)
+        COMPRESSION_SECONDS.observe(time.perf_counter() - start, "response", self.encoding)
+        COMPRESSION_BYTES_SAVED.inc("response", self.encoding, amount=len(body) - len(compressed))
+        return compressed
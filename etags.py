@@ -0,0 +1,98 @@
+# Strong ETags and 304s for the Farida prediction routes.
+#
+# A response is fully determined by the request (route, query, wire formats
+# and body bytes, see singleFlight.request_key), the models being served and
+# the UTC date the hints are picked for (see hintPicker.py). The ETag is a
+# hash of those, so it is known before anything is computed: a request whose
+# If-None-Match holds it gets a 304 straight away, without its body being
+# parsed or a model being called. The key is a sha256 of the raw body, shared
+# with single-flight, so tagging costs one pass over the bytes; like
+# single-flight it runs after admission (see admission.py). Compressed responses get the
+# encoding appended to the tag ("...-gzip", see compression.py), which is
+# ignored when matching. Endpoints whose response also depends on stored
+# state are marked with @no_etag.
+
+import hashlib
+import json
+import os
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from hintPicker import hint_date
+from metrics import Counter, REQUESTS
+from singleFlight import SingleFlightRoute, request_key
+
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+# result: "tagged" (full response with an ETag) or "not_modified" (304)
+ETAG_RESPONSES = Counter("farida_etag_responses_total", "Tagged responses and 304s by route", ("route", "result"))
+
+# Models the tagged responses depend on, see tag_models()
+_models = []
+_fingerprint = (None, "")
+
+def tag_models(models):
+    _models[:] = models
+
+def models_fingerprint() -> str:
+    # Identity of the model files being served; recomputed after a reload
+    global _fingerprint
+    state = tuple((model.path, model.version, model.reloads) for model in _models)
+    if state != _fingerprint[0]:
+        parts = []
+        for model in _models:
+            try:
+                stat = os.stat(model.path)
+                signature = [stat.st_mtime_ns, stat.st_size]
+            except OSError:
+                signature = None
+            parts.append([model.name, model.path, model.version, signature])
+        _fingerprint = (state, json.dumps(parts))
+    return _fingerprint[1]
+
+def response_etag(key: str) -> str:
+    digest = hashlib.sha256(f"{key}\0{models_fingerprint()}\0{hint_date()}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def matching_tag(if_none_match: str, etag: str):
+    # The tag in If-None-Match that matches etag (weak comparison), else None
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag
+        opaque = candidate[2:] if candidate.startswith("W/") else candidate
+        for suffix in ENCODING_SUFFIXES:
+            if opaque.endswith(suffix + '"'):
+                opaque = opaque[:-len(suffix) - 1] + '"'
+                break
+        if opaque == etag:
+            return candidate
+    return None
+
+def no_etag(endpoint):
+    endpoint.no_etag = True
+    return endpoint
+
+class ETagRoute(SingleFlightRoute):
+    def get_admitted_handler(self):
+        handler = super().get_admitted_handler()
+        if "POST" not in (self.methods or ()) or self.body_field is None or getattr(self.endpoint, "no_etag", False):
+            return handler
+        method = ",".join(sorted(self.methods))
+
+        async def etag_handler(request: Request):
+            etag = response_etag(await request_key(request, self.path))
+            matched = matching_tag(request.headers.get("if-none-match", ""), etag)
+            if matched is not None:
+                ETAG_RESPONSES.inc(self.path, "not_modified")
+                REQUESTS.inc(self.path, method, 304)
+                return Response(status_code=304, headers={"ETag": matched, "Vary": "Accept"})
+
+            response = await handler(request)
+            if 200 <= response.status_code < 300 and hasattr(response, "body"):
+                response.headers["ETag"] = etag
+                ETAG_RESPONSES.inc(self.path, "tagged")
+            return response
+
+        return etag_handler
@@ -1,22 +1,209 @@
 from fastapi import FastAPI
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
-import joblib
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from typing import Any, List
 import uvicorn
 import numpy as np
-import random
+import os
+import threading
+import time
 from datetime import datetime, timedelta
+from inferenceBatcher import InferenceCoalescer
+from modelLoader import LazyModel, PRELOAD_MODELS, start_background_load
+from modelRegistry import RegistryError, resolve_model
+from inferencePool import INFERENCE_PROCESSES, InferencePool
+from pregnancyChanceTable import PregnancyChanceTable
+from ovulationStore import STRESS_MAP, OvulationFeatureStore, period_start, state_features
+from wireFormat import NegotiatedResponse
+from admission import admission_status
+from singleFlight import no_single_flight, single_flight_status
+from etags import ETagRoute, no_etag, tag_models
+from metrics import stage
+from hintPicker import HintPicker
+
+def registry_model(name: str) -> LazyModel:
+    # A version that fails verification (e.g. a hash mismatch) only takes its
+    # own routes down: the model is marked failed in /wakeUp and the rest of
+    # the app keeps serving until a reload brings in a good version
+    try:
+        return LazyModel(name, *resolve_model(name))
+    except RegistryError as exc:
+        model = LazyModel(name, *resolve_model(name, verify=False))
+        model.fail(exc)
+        return model
+
+# Models load lazily (or on the warm-up thread started with the server), from
+# the active registry version (python train.py) or the legacy file
+ovulationModel = registry_model("ovulation")
+pregnancyModel = registry_model("pregnancy")
+childcareModel = registry_model("childcare")
+FARIDA_MODELS = [ovulationModel, pregnancyModel, childcareModel]
+# Part of every response's ETag, so a model reload changes them
+tag_models(FARIDA_MODELS)
+
+# Precomputed pregnancy chances (python pregnancyChanceTable.py), model fallback outside the grid
+pregnancyChanceTable = PregnancyChanceTable(pregnancyModel.path)
+
+# Optional worker processes for scoring (FARIDA_INFERENCE_PROCESSES > 0)
+inferencePool = None
+if INFERENCE_PROCESSES > 0:
+    inferencePool = InferencePool(
+        {model.name: model.path for model in FARIDA_MODELS if not model.blocked}, INFERENCE_PROCESSES
+    )
+    for model in FARIDA_MODELS:
+        if not model.blocked:
+            model.pool = inferencePool
+
+def start_model_warmup():
+    if PRELOAD_MODELS:
+        start_background_load(FARIDA_MODELS)
+    if inferencePool is not None:
+        inferencePool.start()
+    if MODEL_WATCH_SECONDS > 0:
+        start_model_watch()
+
+# Running per-user ovulation aggregates for /farida-ovulation-api/incremental
+ovulationStore = OvulationFeatureStore()
+
+def stop_farida_services():
+    if inferencePool is not None:
+        inferencePool.shutdown()
+    ovulationStore.close()
+
+# ----------- Hot model reload -----------
+
+# POST /admin/reload-models needs this token in X-Farida-Admin-Token (unset = disabled)
+ADMIN_TOKEN = os.getenv("FARIDA_ADMIN_TOKEN", "")
+# Poll the registry / model files every N seconds and reload on change (0 = off)
+MODEL_WATCH_SECONDS = float(os.getenv("FARIDA_MODEL_WATCH_SECONDS", "0"))
+
+MODELS_BY_NAME = {model.name: model for model in FARIDA_MODELS}
+_reload_lock = threading.Lock()
+reload_status = {"state": "idle", "started_at": None, "finished_at": None, "models": {}, "error": None}
+
+def reload_models(targets: dict):
+    # targets: {name: (path, version)}. Everything new is loaded and warmed
+    # first; only if all of it succeeds are the references swapped, so a
+    # failed reload leaves the old models serving
+    global inferencePool, pregnancyChanceTable
+    with _reload_lock:
+        reload_status.update(state="loading", started_at=time.time(), finished_at=None, error=None,
+                             models={name: version for name, (_, version) in targets.items()})
+        try:
+            prepared = {name: MODELS_BY_NAME[name].prepare(path) for name, (path, _) in targets.items()}
+
+            new_pool = None
+            if inferencePool is not None:
+                paths = {model.name: model.path for model in FARIDA_MODELS if not model.blocked}
+                paths.update({name: path for name, (path, _) in targets.items()})
+                new_pool = InferencePool(paths, inferencePool.processes, inferencePool.timeout)
+                new_pool.start(wait=True)
+
+            new_table = None
+            if "pregnancy" in targets:
+                new_table = PregnancyChanceTable(targets["pregnancy"][0])
+                new_table._load()
+        except Exception as exc:
+            reload_status.update(state="failed", finished_at=time.time(), error=f"{type(exc).__name__}: {exc}")
+            return False
+
+        for name, (path, version) in targets.items():
+            MODELS_BY_NAME[name].swap(prepared[name], path, version)
+        if new_table is not None:
+            pregnancyChanceTable = new_table
+        if new_pool is not None:
+            old_pool, inferencePool = inferencePool, new_pool
+            for model in FARIDA_MODELS:
+                if model.name in new_pool.model_paths:
+                    model.pool = new_pool
+            old_pool.drain(successor=new_pool)
+        reload_status.update(state="done", finished_at=time.time())
+        return True
+
+def changed_models(names: list, version: str = None) -> dict:
+    # Resolved (path, version) of the named models that differ from what is serving
+    targets = {}
+    for name in names:
+        path, resolved_version = resolve_model(name, version=version)
+        model = MODELS_BY_NAME[name]
+        if (path, resolved_version) != (model.path, model.version) or not model.ready:
+            targets[name] = (path, resolved_version)
+    return targets
+
+def file_signature(path: str):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
 
-# Load models
-ovulationModel = joblib.load("ovulationFaridaModel.joblib")
-pregnancyModel = joblib.load("pregnancyFaridaModel.joblib")
-childcareModel = joblib.load("childcareModel.joblib")
-
-STRESS_MAP = {"low": 0, "medium": 1, "high": 2}
-
-router = APIRouter()
+_watch_thread = None
+
+def start_model_watch():
+    # Reloads a model when its resolved path or version changes (e.g. train.py
+    # activated a new version) or its file is rewritten in place
+    global _watch_thread
+    if _watch_thread is not None:
+        return
+
+    def serving(model):
+        return model.path, model.version, file_signature(model.path)
+
+    def watch():
+        seen = {model.name: serving(model) for model in FARIDA_MODELS}
+        reloads = {model.name: model.reloads for model in FARIDA_MODELS}
+        while True:
+            time.sleep(MODEL_WATCH_SECONDS)
+            for name, model in MODELS_BY_NAME.items():
+                # Swapped since the last poll, by this thread or /admin/reload-models:
+                # what is serving now is the baseline, not a change
+                if model.reloads != reloads[name]:
+                    reloads[name] = model.reloads
+                    seen[name] = serving(model)
+            targets = {}
+            for name in MODELS_BY_NAME:
+                try:
+                    path, version = resolve_model(name, verify=False)
+                except RegistryError:
+                    continue
+                current = (path, version, file_signature(path))
+                if current != seen[name] and current[2] is not None:
+                    targets[name] = (path, version)
+                    seen[name] = current
+            if targets:
+                try:
+                    targets = {name: resolve_model(name) for name in targets}
+                except RegistryError as exc:
+                    reload_status.update(state="failed", finished_at=time.time(), error=str(exc))
+                    continue
+                reload_models(targets)
+
+    _watch_thread = threading.Thread(target=watch, name="model-watch", daemon=True)
+    _watch_thread.start()
+
+# Micro-batching of concurrent single-user predictions (disabled while the wait window is 0)
+COALESCE_WAIT_MS = float(os.getenv("FARIDA_COALESCE_WAIT_MS", "0"))
+COALESCE_MAX_BATCH = int(os.getenv("FARIDA_COALESCE_MAX_BATCH", "64"))
+
+ovulationPredictor = InferenceCoalescer(
+    "ovulation", lambda rows: ovulationModel.predict(rows), COALESCE_MAX_BATCH, COALESCE_WAIT_MS
+)
+pregnancyPredictor = InferenceCoalescer(
+    "pregnancy", lambda rows: pregnancyModel.predict(rows), COALESCE_MAX_BATCH, COALESCE_WAIT_MS
+)
+pregnancyChancePredictor = InferenceCoalescer(
+    "pregnancy_chance", lambda rows: pregnancyModel.predict_proba(rows), COALESCE_MAX_BATCH, COALESCE_WAIT_MS
+)
+childcarePredictor = InferenceCoalescer(
+    "childcare", lambda rows: childcareModel.predict(rows), COALESCE_MAX_BATCH, COALESCE_WAIT_MS
+)
+
+# JSON by default, MessagePack / columnar MessagePack on request (see wireFormat.py);
+# identical POSTs close together share one computation (see singleFlight.py)
+# and responses carry ETags (see etags.py)
+router = APIRouter(route_class=ETagRoute, default_response_class=NegotiatedResponse)
 
 # ----------- Data Models -----------
 
@@ -55,6 +242,10 @@ class PregnanceRecord(BaseModel):
 class PregnanceRequest(BaseModel):
     filteredPregnance: List[PregnanceRecord]
 
+# Envelope of the pregnancy routes: records stay raw, see tail_records
+class PregnanceHistory(BaseModel):
+    filteredPregnance: List[Any]
+
 class ChildcareRecord(BaseModel):
     id: int
     created_at: str
@@ -71,6 +262,10 @@ class ChildcareRecord(BaseModel):
 class ChildcareRequest(BaseModel):
     filteredChildcare: List[ChildcareRecord]
 
+# Envelope of the childcare routes: records stay raw, see tail_records
+class ChildcareHistory(BaseModel):
+    filteredChildcare: List[Any]
+
 # ----------- Utility Functions -----------
 
 def calculate_ovulation_date(last_period_date: str, cycle_length: int = 28):
@@ -86,11 +281,76 @@ def format_date(dt: datetime):
         return dt.strftime("%Y-%m-%d")
     return None
 
+def tail_records(records: list, record_model, keep: int, loc: tuple) -> List[dict]:
+    # Validate and convert only the last `keep` records; older ones are never
+    # read, so long histories cost no more than short ones
+    start = max(0, len(records) - keep)
+    tail = []
+    with stage("to_dict"):
+        for index in range(start, len(records)):
+            try:
+                tail.append(record_model.model_validate(records[index]).dict())
+            except ValidationError as exc:
+                raise RequestValidationError([
+                    {**error, "loc": ("body",) + loc + (index,) + tuple(error["loc"])}
+                    for error in exc.errors(include_url=False)
+                ])
+    return tail
+
 # ----------- Routes -----------
 
 @router.get("/wakeUp")
 def wake_up():
-    return {"status": "OK"}
+    start_model_warmup()
+    return {
+        "status": "OK",
+        "models_ready": all(model.ready for model in FARIDA_MODELS),
+        "models": {model.name: model.status() for model in FARIDA_MODELS},
+        "pregnancy_chance_table": pregnancyChanceTable.status(),
+        "reload": reload_status,
+        "admission": admission_status(),
+    }
+
+# Loads and warms the requested models in the background, then swaps them
+# in; progress and the outcome are reported here and in /wakeUp
+@router.post("/admin/reload-models", status_code=202)
+def reload_models_route(
+    model: List[str] = Query(default=None), version: str = None, force: bool = False,
+    x_farida_admin_token: str = Header(default=""),
+):
+    if not ADMIN_TOKEN or x_farida_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+    names = model or list(MODELS_BY_NAME)
+    unknown = [name for name in names if name not in MODELS_BY_NAME]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown models: {', '.join(unknown)}")
+    if version is not None and len(names) != 1:
+        raise HTTPException(status_code=400, detail="A version can only be given for a single model")
+    if _reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A reload is already running")
+
+    try:
+        if force:
+            targets = {name: resolve_model(name, version=version) for name in names}
+        else:
+            targets = changed_models(names, version)
+    except RegistryError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if targets:
+        threading.Thread(target=reload_models, args=(targets,), name="model-reload", daemon=True).start()
+    return {
+        "reloading": {name: {"path": path, "version": version} for name, (path, version) in targets.items()},
+        "status": reload_status,
+    }
+
+@router.get("/farida-coalescer-stats")
+def coalescer_stats():
+    stats = {
+        predictor.name: predictor.stats()
+        for predictor in (ovulationPredictor, pregnancyPredictor, pregnancyChancePredictor, childcarePredictor)
+    }
+    stats["single_flight"] = single_flight_status()
+    return stats
 
 # ----------- Ovulation Logic -----------
 
@@ -102,9 +362,10 @@ def probabilistic_score(record):
     score += 1 if record["day_week_exercise"] >= 1 else 0
     return 1 if score >= 4 else 0
 
-def predict_user_condition(user_data: List[dict]):
+def ovulation_condition_features(user_data: List[dict]):
+    # Short histories are scored with probabilistic_score instead of the model
     if len(user_data) < 3:
-        return probabilistic_score(user_data[-1])
+        return None
 
     avg_sleep = np.mean([d['sleep_hours'] for d in user_data])
     avg_exercise = np.mean([d['day_week_exercise'] for d in user_data])
@@ -112,38 +373,17 @@ def predict_user_condition(user_data: List[dict]):
     regular_ratio = sum(d['is_cycle_regular'] for d in user_data) / len(user_data)
     avg_stress = np.mean([STRESS_MAP[d['stress_level']] for d in user_data])
 
-    features = [[
+    return [
         user_data[-1]["age"],
         regular_ratio,
         avg_stress,
         avg_sleep,
         avg_exercise,
         cycle_std,
-    ]]
-
-    return int(ovulationModel.predict(features)[0])
+    ]
 
-@router.post("/farida-ovulation-api")
-def predict_ovulation(request: OvulationRequest):
-    user_data = [record.dict() for record in request.filteredOvulation]
-    if not user_data:
-        return {"error": "No ovulation data provided."}
-
-    condition_ok = predict_user_condition(user_data)
-    latest = user_data[-1]
-    ovulation_dt = calculate_ovulation_date(
-        latest["last_period_date"], latest["cycle_length_days"]
-    )
-
-    if ovulation_dt:
-        fertile_window_start = ovulation_dt - timedelta(days=5)
-        fertile_window_end = ovulation_dt
-        next_period_dt = ovulation_dt + timedelta(days=14)
-    else:
-        fertile_window_start = fertile_window_end = next_period_dt = None
-
-    # Pregnancy chance prediction
-    pregnancy_features = [[
+def pregnancy_chance_features(latest: dict):
+    return [
         latest["age"],
         1 if latest["is_cycle_regular"] else 0,
         STRESS_MAP.get(latest["stress_level"], 1),
@@ -151,50 +391,85 @@ def predict_ovulation(request: OvulationRequest):
         latest["day_week_exercise"],
         latest["cycle_length_days"],
         latest["period_duration_days"],
-    ]]
-    pregnancy_chance = pregnancyModel.predict_proba(pregnancy_features)[0][1]
+    ]
+
+def pregnancy_chance_percent(latest: dict):
+    with stage("pregnancy_chance"):
+        features = pregnancy_chance_features(latest)
+        percent = pregnancyChanceTable.lookup(features)
+        if percent is None:
+            percent = round(pregnancyChancePredictor.predict(features)[1] * 100, 2)
+    return percent
+
+def predict_user_condition(user_data: List[dict]):
+    with stage("features"):
+        features = ovulation_condition_features(user_data)
+    if features is None:
+        return probabilistic_score(user_data[-1])
+
+    with stage("model"):
+        return int(ovulationPredictor.predict(features))
 
+def ovulation_hint(latest: dict, picker: HintPicker):
     hint_list = []
 
     if not latest["is_cycle_regular"]:
-        hint_list.append(random.choice([
+        hint_list.append(picker.choice([
             "Cycle is irregular. Consider tracking it or consulting a doctor.",
             "Irregular cycles may signal hormonal changes — consult a specialist.",
             "Tracking irregular cycles helps predict ovulation better."
         ]))
 
     if latest["sleep_hours"] < 6:
-        hint_list.append(random.choice([
+        hint_list.append(picker.choice([
             "Try to get at least 6-8 hours of sleep.",
             "Your sleep seems low — aim for restful nights 💤",
             "Sleep is vital for hormonal balance. Improve it! 😴"
         ]))
 
     if latest["stress_level"] == "high":
-        hint_list.append(random.choice([
+        hint_list.append(picker.choice([
             "Your stress level is high. Consider stress-relief activities.",
             "Try yoga, meditation, or light walks to reduce stress.",
             "Stress affects ovulation. Try to unwind and relax 💆‍♀️"
         ]))
 
     if latest["day_week_exercise"] < 2:
-        hint_list.append(random.choice([
+        hint_list.append(picker.choice([
             "Increase exercise to at least 2-3 times a week.",
             "Staying active supports reproductive health!",
             "Light exercise boosts circulation and hormones 🏃‍♀️"
         ]))
 
-    final_hint = random.choice(hint_list) if hint_list else "Great job! You're maintaining healthy habits. ✅"
+    return picker.choice(hint_list) if hint_list else "Great job! You're maintaining healthy habits. ✅"
+
+def build_ovulation_response(user_data: List[dict], condition_ok: int, pregnancy_chance_pct: float):
+    latest = user_data[-1]
+    with stage("dates"):
+        ovulation_dt = calculate_ovulation_date(
+            latest["last_period_date"], latest["cycle_length_days"]
+        )
+
+        if ovulation_dt:
+            fertile_window_start = ovulation_dt - timedelta(days=5)
+            fertile_window_end = ovulation_dt
+            next_period_dt = ovulation_dt + timedelta(days=14)
+        else:
+            fertile_window_start = fertile_window_end = next_period_dt = None
+
+    with stage("hints"):
+        picker = HintPicker("ovulation", latest)
+        final_hint = ovulation_hint(latest, picker)
 
     return {
         "userID": latest["userID"],
         "name": latest["name"],
         "condition_ok": condition_ok,
-        "message": random.choice([
+        "message": picker.choice([
             "All looks good ✅",
             "Healthy signs! Keep it up 🌸",
             "Ovulation health is in a good place 👍"
-        ]) if condition_ok else random.choice([
+        ]) if condition_ok else picker.choice([
             "Something may need attention ⚠️",
             "Ovulation pattern off. Please track or consult 🩺",
             "Some concerns detected. Monitor carefully 👩‍⚕️"
@@ -204,15 +479,213 @@ def predict_ovulation(request: OvulationRequest):
         "fertile_window_start": format_date(fertile_window_start),
         "fertile_window_end": format_date(fertile_window_end),
         "predicted_next_period_date": format_date(next_period_dt),
-        "predicted_pregnancy_chance": round(pregnancy_chance * 100, 2),  # % value
+        "predicted_pregnancy_chance": pregnancy_chance_pct,  # % value
     }
 
-# ----------- Pregnancy Logic -----------
+@router.post("/farida-ovulation-api")
+def predict_ovulation(request: OvulationRequest):
+    with stage("to_dict"):
+        user_data = [record.dict() for record in request.filteredOvulation]
+    if not user_data:
+        return {"error": "No ovulation data provided."}
 
-def predict_pregnancy_condition(user_data: List[dict]):
-    latest = user_data[-1]
+    condition_ok = predict_user_condition(user_data)
 
-    features = [[
+    # Pregnancy chance prediction
+    pregnancy_chance_pct = pregnancy_chance_percent(user_data[-1])
+
+    return build_ovulation_response(user_data, condition_ok, pregnancy_chance_pct)
+
+# Scores many users at once: one ovulationModel and one pregnancyModel call per batch
+@router.post("/farida-ovulation-api/batch")
+def predict_ovulation_batch(data: List[OvulationRequest]):
+    with stage("to_dict"):
+        histories = [[record.dict() for record in item.filteredOvulation] for item in data]
+        histories = [user_data for user_data in histories if user_data]
+    if not histories:
+        return {}
+
+    conditions = []
+    model_rows, model_index = [], []
+    with stage("features"):
+        for i, user_data in enumerate(histories):
+            features = ovulation_condition_features(user_data)
+            if features is None:
+                conditions.append(probabilistic_score(user_data[-1]))
+            else:
+                conditions.append(None)
+                model_rows.append(features)
+                model_index.append(i)
+
+    if model_rows:
+        with stage("model"):
+            for i, prediction in zip(model_index, ovulationModel.predict(model_rows)):
+                conditions[i] = int(prediction)
+
+    # Table lookups first, one pregnancyModel call for the rows outside the grid
+    with stage("pregnancy_chance"):
+        chance_rows = [pregnancy_chance_features(user_data[-1]) for user_data in histories]
+        pregnancy_chances = pregnancyChanceTable.lookup_many(chance_rows).tolist()
+        misses = [i for i, percent in enumerate(pregnancy_chances) if percent != percent]
+        if misses:
+            probas = pregnancyModel.predict_proba([chance_rows[i] for i in misses])[:, 1]
+            for i, proba in zip(misses, probas):
+                pregnancy_chances[i] = round(proba * 100, 2)
+
+    return {
+        user_data[-1]["userID"]: build_ovulation_response(user_data, condition_ok, pregnancy_chance_pct)
+        for user_data, condition_ok, pregnancy_chance_pct in zip(histories, conditions, pregnancy_chances)
+    }
+
+# Calendar projections: cycles per request by default and at most
+CALENDAR_CYCLES = 12
+MAX_CALENDAR_CYCLES = 60
+# datetime's range: dates outside years 1-9999 are None, as calculate_ovulation_date gives
+FIRST_DAY = np.datetime64("0001-01-01", "D").astype(np.int64)
+LAST_DAY = np.datetime64("9999-12-31", "D").astype(np.int64)
+
+def parse_period_dates(values: List[str]) -> np.ndarray:
+    # datetime64[D] of each "%Y-%m-%d" string, NaT where calculate_ovulation_date
+    # would give None
+    if all(len(value) == 10 for value in values):
+        try:
+            return np.array(values, dtype="datetime64[D]")
+        except ValueError:
+            pass
+    parsed = []
+    for value in values:
+        try:
+            parsed.append(np.datetime64(datetime.strptime(value, "%Y-%m-%d").date(), "D"))
+        except ValueError:
+            parsed.append(np.datetime64("NaT", "D"))
+    return np.array(parsed, dtype="datetime64[D]")
+
+def cycle_statistics(histories: List[List[OvulationRecord]]):
+    # Mean cycle length (rounded to whole days) and its standard deviation for
+    # every user, the same spread ovulation_condition_features uses
+    counts = np.array([len(records) for records in histories])
+    user = np.repeat(np.arange(len(histories)), counts)
+    lengths = np.fromiter(
+        (record.cycle_length_days for records in histories for record in records),
+        dtype=np.float64, count=int(counts.sum()),
+    )
+    mean = np.bincount(user, weights=lengths) / counts
+    std = np.sqrt(np.bincount(user, weights=(lengths - mean[user]) ** 2) / counts)
+    return np.floor(mean + 0.5), std
+
+def day_dates(days: np.ndarray) -> np.ndarray:
+    # datetime64[D] of float day numbers (days since 1970-01-01), NaT for NaN
+    # and for days outside years 1-9999. Day offsets are added up as floats so
+    # that any cycle length, however large, cannot overflow the arithmetic.
+    valid = (days >= FIRST_DAY) & (days <= LAST_DAY)
+    dates = np.full(days.shape, np.datetime64("NaT"), dtype="datetime64[D]")
+    dates[valid] = days[valid].astype(np.int64).astype("datetime64[D]")
+    return dates
+
+def date_strings(dates: np.ndarray) -> list:
+    # "%Y-%m-%d" (None for NaT) of every date. Calendars span a few hundred
+    # distinct days, so each day is formatted once and the strings gathered.
+    valid = ~np.isnat(dates)
+    strings = np.full(dates.shape, None, dtype=object)
+    if valid.any():
+        days = dates[valid].astype(np.int64)
+        first, last = days.min(), days.max()
+        if last - first < days.size:
+            table = np.datetime_as_string(np.arange(first, last + 1).astype("datetime64[D]")).astype(object)
+            strings[valid] = table[days - first]
+        else:
+            strings[valid] = np.datetime_as_string(dates[valid]).astype(object)
+    return strings.tolist()
+
+# Projects the next `cycles` cycles of every user in one pass. The current
+# cycle uses the latest record's length (so it matches /farida-ovulation-api),
+# later ones the mean length; ovulation, fertile window and next period are
+# placed as in build_ovulation_response. The result is plain JSON values
+# already, so it is returned as a response rather than run through FastAPI's
+# encoder (most of the time for a large calendar).
+@router.post("/farida-ovulation-api/calendar")
+def ovulation_calendar(data: List[OvulationRequest], cycles: int = Query(CALENDAR_CYCLES, ge=1, le=MAX_CALENDAR_CYCLES)):
+    histories = [item.filteredOvulation for item in data if item.filteredOvulation]
+    if not histories:
+        return {}
+
+    with stage("features"):
+        mean_length, cycle_std = cycle_statistics(histories)
+
+    with stage("dates"):
+        latest = [records[-1] for records in histories]
+        last_period = parse_period_dates([record.last_period_date for record in latest])
+        last_day = np.where(np.isnat(last_period), np.nan, last_period.astype(np.int64))
+        lengths = np.repeat(mean_length[:, None], cycles, axis=1)
+        lengths[:, 0] = [float(record.cycle_length_days) for record in latest]
+        period_start = last_day[:, None] + (np.cumsum(lengths, axis=1) - lengths)
+        ovulation = period_start + lengths - 14
+        columns = {
+            "period_start": date_strings(day_dates(period_start)),
+            "predicted_ovulation_date": date_strings(day_dates(ovulation)),
+            "fertile_window_start": date_strings(day_dates(ovulation - 5)),
+            "fertile_window_end": date_strings(day_dates(ovulation)),
+            "predicted_next_period_date": date_strings(day_dates(period_start + lengths)),
+        }
+
+    return NegotiatedResponse({
+        record.userID: {
+            "name": record.name,
+            "cycle_length_days": int(mean_length[i]),
+            "cycle_std_days": round(float(cycle_std[i]), 2),
+            **{field: dates[i] for field, dates in columns.items()},
+        }
+        for i, record in enumerate(latest)
+    })
+
+# Clients send only the cycles added since their last call; the store keeps
+# the running history aggregates, so the features cost O(1) per request
+@router.post("/farida-ovulation-api/incremental")
+@no_etag
+@no_single_flight
+def predict_ovulation_incremental(request: OvulationRequest):
+    with stage("to_dict"):
+        records = [record.dict() for record in request.filteredOvulation]
+    if not records:
+        return {"error": "No ovulation data provided."}
+    user_ids = {record["userID"] for record in records}
+    if len(user_ids) > 1:
+        return {"error": "All records must belong to the same userID."}
+    # The store orders cycles by this date, so one that does not parse is
+    # rejected here rather than stored
+    invalid = [index for index, record in enumerate(records) if period_start(record) is None]
+    if invalid:
+        raise RequestValidationError([
+            {
+                "type": "value_error",
+                "loc": ("body", "filteredOvulation", index, "last_period_date"),
+                "msg": "Value error, last_period_date must be a date in YYYY-MM-DD format",
+                "input": records[index]["last_period_date"],
+            }
+            for index in invalid
+        ])
+
+    with stage("store"):
+        state, _ = ovulationStore.append(user_ids.pop(), records)
+    latest = state["latest"]
+
+    features = state_features(state)
+    if features is None:
+        condition_ok = probabilistic_score(latest)
+    else:
+        with stage("model"):
+            condition_ok = int(ovulationPredictor.predict(features))
+
+    return build_ovulation_response([latest], condition_ok, pregnancy_chance_percent(latest))
+
+@router.delete("/farida-ovulation-api/incremental/{user_id}")
+def reset_ovulation_history(user_id: str):
+    return {"userID": user_id, "deleted": ovulationStore.delete(user_id)}
+
+# ----------- Pregnancy Logic -----------
+
+def pregnancy_condition_features(latest: dict):
+    return [
         latest["pregnance_week"],
         latest["featus_number"],
         int(latest["is_smoking"]),
@@ -220,18 +693,16 @@ def predict_pregnancy_condition(user_data: List[dict]):
         int(latest["mental_health_problem"]),
         latest["fetal_HR"],
         latest["mother_HR"]
-    ]]
+    ]
 
-    return int(pregnancyModel.predict(features)[0])
+def predict_pregnancy_condition(user_data: List[dict]):
+    with stage("features"):
+        features = pregnancy_condition_features(user_data[-1])
 
-@router.post("/farida-pregnancy-api")
-def predict_pregnancy(request: PregnanceRequest):
-    user_data = [record.dict() for record in request.filteredPregnance]
-    if not user_data:
-        return {"error": "No pregnancy data provided."}
+    with stage("model"):
+        return int(pregnancyPredictor.predict(features))
 
-    condition_ok = predict_pregnancy_condition(user_data)
-    latest = user_data[-1]
+def pregnancy_hint(latest: dict, picker: HintPicker):
     hint_list = []
 
     if latest["is_smoking"]:
@@ -240,7 +711,7 @@ def predict_pregnancy(request: PregnanceRequest):
             "Avoid smoking — it's linked to preterm birth risks.",
             "Quit smoking to protect your baby’s lungs."
         ]
-        hint_list.append(random.choice(smoking_hints))
+        hint_list.append(picker.choice(smoking_hints))
 
     if latest["is_drinking"]:
         drinking_hints = [
@@ -248,7 +719,7 @@ def predict_pregnancy(request: PregnanceRequest):
             "Even small amounts of alcohol may impact development.",
             "Pregnancy and alcohol don’t mix — stay safe."
         ]
-        hint_list.append(random.choice(drinking_hints))
+        hint_list.append(picker.choice(drinking_hints))
 
     if latest["mental_health_problem"]:
         mental_hints = [
@@ -256,7 +727,7 @@ def predict_pregnancy(request: PregnanceRequest):
             "Talk to someone — mental wellness helps both mom and baby.",
             "Seek mental health guidance if you feel overwhelmed."
         ]
-        hint_list.append(random.choice(mental_hints))
+        hint_list.append(picker.choice(mental_hints))
 
     if latest["fetal_HR"] <= 0:
         hr_hints = [
@@ -264,7 +735,7 @@ def predict_pregnancy(request: PregnanceRequest):
             "Missing fetal HR — get it checked ASAP.",
             "Check fetal heartbeat to ensure baby’s well-being."
         ]
-        hint_list.append(random.choice(hr_hints))
+        hint_list.append(picker.choice(hr_hints))
 
     if latest["mother_HR"] <= 0:
         mother_hr_hints = [
@@ -272,18 +743,24 @@ def predict_pregnancy(request: PregnanceRequest):
             "Record mother's HR regularly for safety.",
             "Missing maternal HR data — please follow up."
         ]
-        hint_list.append(random.choice(mother_hr_hints))
+        hint_list.append(picker.choice(mother_hr_hints))
 
-    final_hint = random.choice(hint_list) if hint_list else "You're doing well! Keep following health guidelines. ✅"
+    return picker.choice(hint_list) if hint_list else "You're doing well! Keep following health guidelines. ✅"
+
+def build_pregnancy_response(user_data: List[dict], condition_ok: int):
+    latest = user_data[-1]
+    with stage("hints"):
+        picker = HintPicker("pregnancy", latest)
+        final_hint = pregnancy_hint(latest, picker)
 
     return {
         "userID": latest["userID"],
         "condition_ok": condition_ok,
-        "message": random.choice([
+        "message": picker.choice([
             "Pregnancy health looks great ✅",
             "Stable signs detected — good job mama! 👶",
             "No serious issues seen — keep going strong!"
-        ]) if condition_ok else random.choice([
+        ]) if condition_ok else picker.choice([
             "Possible pregnancy concerns. Please consult ⚠️",
             "Watch out — irregular indicators detected 👩‍⚕️",
             "Some warning signs found — monitor closely 🩺"
@@ -291,33 +768,61 @@ def predict_pregnancy(request: PregnanceRequest):
         "hint": [final_hint]
     }
 
-# ----------- Childcare Logic -----------
+@router.post("/farida-pregnancy-api")
+def predict_pregnancy(request: PregnanceHistory):
+    # Only the latest record is used
+    user_data = tail_records(request.filteredPregnance, PregnanceRecord, 1, ("filteredPregnance",))
+    if not user_data:
+        return {"error": "No pregnancy data provided."}
 
-def predict_childcare_condition(user_data: List[dict]):
-    latest = user_data[-1]
+    condition_ok = predict_pregnancy_condition(user_data)
+    return build_pregnancy_response(user_data, condition_ok)
+
+# Scores many users at once: one pregnancyModel call per batch
+@router.post("/farida-pregnancy-api/batch")
+def predict_pregnancy_batch(data: List[PregnanceHistory]):
+    histories = [
+        tail_records(item.filteredPregnance, PregnanceRecord, 1, (i, "filteredPregnance"))
+        for i, item in enumerate(data)
+    ]
+    histories = [user_data for user_data in histories if user_data]
+    if not histories:
+        return {}
+
+    with stage("features"):
+        rows = [pregnancy_condition_features(user_data[-1]) for user_data in histories]
+    with stage("model"):
+        conditions = pregnancyModel.predict(rows)
+
+    return {
+        user_data[-1]["userID"]: build_pregnancy_response(user_data, int(condition_ok))
+        for user_data, condition_ok in zip(histories, conditions)
+    }
 
-    feeding_type_map = {"breastfeeding": 0, "formula": 1, "mixed": 2}
-    gender_map = {"male": 0, "female": 1}
+# ----------- Childcare Logic -----------
+
+FEEDING_TYPE_MAP = {"breastfeeding": 0, "formula": 1, "mixed": 2}
+GENDER_MAP = {"male": 0, "female": 1}
 
-    features = [[
+def childcare_condition_features(latest: dict):
+    return [
         latest["baby_age_month"],
-        gender_map.get(latest["gender"].lower(), 0),
+        GENDER_MAP.get(latest["gender"].lower(), 0),
         latest["birth_weight"],
         latest["current_weight"],
-        feeding_type_map.get(latest["feeding_type"].lower(), 0),
+        FEEDING_TYPE_MAP.get(latest["feeding_type"].lower(), 0),
         latest["feeding_frequency"],
         latest["sleep_hours"],
-    ]]
+    ]
 
-    return int(childcareModel.predict(features)[0])
+def predict_childcare_condition(user_data: List[dict]):
+    with stage("features"):
+        features = childcare_condition_features(user_data[-1])
 
-@router.post("/farida-childcare-api")
-def predict_childcare(request: ChildcareRequest):
-    user_data = [record.dict() for record in request.filteredChildcare]
-    if not user_data:
-        return {"error": "No childcare data provided."}
+    with stage("model"):
+        return int(childcarePredictor.predict(features))
 
-    condition_ok = predict_childcare_condition(user_data)
+def childcare_hint(user_data: List[dict], picker: HintPicker):
     latest = user_data[-1]
     prevWeight = user_data[-2]["current_weight"] if len(user_data) > 1 else latest["current_weight"]
     hint_list = []
@@ -328,7 +833,7 @@ def predict_childcare(request: ChildcareRequest):
             "Growth check: baby's weight is lower than before.",
             "Unexpected weight loss. Visit your pediatric specialist."
         ]
-        hint_list.append(random.choice(weight_hints))
+        hint_list.append(picker.choice(weight_hints))
 
     if latest["feeding_frequency"] < 8:
         feeding_hints = [
@@ -336,7 +841,7 @@ def predict_childcare(request: ChildcareRequest):
             "Newborns need frequent feeds — increase feeding sessions.",
             "Consider shorter intervals between feedings."
         ]
-        hint_list.append(random.choice(feeding_hints))
+        hint_list.append(picker.choice(feeding_hints))
 
     if latest["sleep_hours"] < 14:
         sleep_hints = [
@@ -344,21 +849,58 @@ def predict_childcare(request: ChildcareRequest):
             "Sleep is crucial for baby's brain development.",
             "Try to create a quiet sleep routine for the baby."
         ]
-        hint_list.append(random.choice(sleep_hints))
+        hint_list.append(picker.choice(sleep_hints))
+
+    return picker.choice(hint_list) if hint_list else "Baby’s growth and care patterns seem healthy ✅"
 
-    final_hint = random.choice(hint_list) if hint_list else "Baby’s growth and care patterns seem healthy ✅"
+def build_childcare_response(user_data: List[dict], condition_ok: int):
+    latest = user_data[-1]
+    with stage("hints"):
+        picker = HintPicker("childcare", user_data[-2:])
+        final_hint = childcare_hint(user_data, picker)
 
     return {
         "userID": latest["userID"],
         "condition_ok": condition_ok,
-        "message": random.choice([
+        "message": picker.choice([
             "All childcare signs are healthy ✅",
             "Great progress — baby is on the right track 👶",
             "Health metrics look good — keep caring lovingly 💖"
-        ]) if condition_ok else random.choice([
+        ]) if condition_ok else picker.choice([
             "Care indicators show some concerns ⚠️",
             "Monitor baby’s growth more closely.",
             "Pediatrician check may be helpful 🩺"
         ]),
         "hint": [final_hint]
     }
+
+@router.post("/farida-childcare-api")
+def predict_childcare(request: ChildcareHistory):
+    # The latest record plus the one before it for the weight trend
+    user_data = tail_records(request.filteredChildcare, ChildcareRecord, 2, ("filteredChildcare",))
+    if not user_data:
+        return {"error": "No childcare data provided."}
+
+    condition_ok = predict_childcare_condition(user_data)
+    return build_childcare_response(user_data, condition_ok)
+
+# Scores many users at once: one childcareModel call per batch
+@router.post("/farida-childcare-api/batch")
+def predict_childcare_batch(data: List[ChildcareHistory]):
+    histories = [
+        tail_records(item.filteredChildcare, ChildcareRecord, 2, (i, "filteredChildcare"))
+        for i, item in enumerate(data)
+    ]
+    histories = [user_data for user_data in histories if user_data]
+    if not histories:
+        return {}
+
+    with stage("features"):
+        rows = [childcare_condition_features(user_data[-1]) for user_data in histories]
+    with stage("model"):
+        conditions = childcareModel.predict(rows)
+
+    return {
+        user_data[-1]["userID"]: build_childcare_response(user_data, int(condition_ok))
+        for user_data, condition_ok in zip(histories, conditions)
+    }
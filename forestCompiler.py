@@ -0,0 +1,511 @@
+# Compiles the fitted StandardScaler + RandomForestClassifier pipelines into
+# flat NumPy node arrays and evaluates them with a vectorized traversal.
+#
+# sklearn scales X in float64, casts it to float32 and then compares against
+# each node's float64 threshold. That composite map is monotonic, so every
+# split "float32((x - mean) / scale) <= t" is equivalent to "x <= T" for one
+# float64 T per node. We find T exactly with a binary search over the ordered
+# float64 bit patterns, which lets the compiled forest work on raw features
+# and still reach the same leaves as sklearn, bit for bit.
+#
+# Compiled forests can be exported to a `.forest` file: a small JSON header
+# followed by the raw node arrays, each 64-byte aligned. load_compiled() maps
+# the file read-only, so startup does no unpickling and every uvicorn worker
+# on a host shares the same physical pages.
+#
+#   python forestCompiler.py           check against sklearn and print timings
+#   python forestCompiler.py export    write a .forest next to each .joblib
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+_SIGN_BIT = np.int64(-0x8000000000000000)
+_MAGNITUDE = np.int64(0x7FFFFFFFFFFFFFFF)
+
+# Bitvector tables bigger than this fall back to node-by-node traversal
+MAX_BITVECTOR_TABLE_BYTES = 64 << 20
+# Rows scored per chunk, bounds the (rows x features x trees) mask gather
+CHUNK_ROWS = 2048
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, missing_left, roots, leaf_values, classes, n_features,
+                 max_depth, split_thresholds=None, split_offsets=None, split_masks=None, leaf_nodes=None,
+                 leaf_offsets=None):
+        # Node arrays: one entry per node of every tree, leaves point back at themselves
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.roots = roots
+        self.leaf_values = leaf_values
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+        self.max_depth = int(max_depth)
+
+        # Bitvector (QuickScorer-style) tables, see _build_bitvector_tables
+        self.split_thresholds = split_thresholds
+        self.split_offsets = split_offsets
+        self.split_masks = split_masks
+        self.leaf_nodes = leaf_nodes
+        self.leaf_offsets = leaf_offsets
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def uses_bitvectors(self):
+        return self.split_masks is not None
+
+    def _check_input(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}"
+            )
+        return X
+
+    def apply(self, X):
+        X = self._check_input(X)
+        if not self.uses_bitvectors:
+            return self._traverse(X)
+
+        leaves = np.empty((X.shape[0], self.n_trees), dtype=np.intp)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            if np.isnan(chunk).any():
+                leaves[start:start + CHUNK_ROWS] = self._traverse(chunk)
+            else:
+                leaves[start:start + CHUNK_ROWS] = self._exit_leaves(chunk)
+        return leaves
+
+    def _exit_leaves(self, X):
+        # A split is "false" (sample goes right) when its threshold is below the
+        # value, so the false splits of a feature are a prefix of its sorted
+        # thresholds. ANDing the precomputed prefix masks of every feature leaves
+        # the exit leaf of each tree as its lowest set bit.
+        rows = np.empty(X.shape, dtype=np.intp)
+        for f in range(self.n_features_in_):
+            lo, hi = self.split_offsets[f], self.split_offsets[f + 1]
+            rows[:, f] = np.searchsorted(self.split_thresholds[lo:hi], X[:, f], side="left") + lo + f
+        masks = np.bitwise_and.reduce(self.split_masks[rows], axis=1)
+
+        # Lowest set bit per tree across the mask words, read off the float64 exponent
+        if masks.shape[2] == 1:
+            word, bits = 0, masks[..., 0]
+        else:
+            word = np.argmax(masks != 0, axis=2)
+            bits = np.take_along_axis(masks, word[..., None], axis=2)[..., 0]
+        lowest = bits & (~bits + np.uint64(1))
+        bit = (lowest.astype(np.float64).view(np.int64) >> 52) - 1023
+        local_leaf = word * 64 + bit
+        return self.leaf_nodes[self.leaf_offsets + local_leaf]
+
+    def _traverse(self, X):
+        n_samples = X.shape[0]
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_samples, dtype=np.intp) * self.n_features_in_)[:, None]
+        node = np.repeat(self.roots[None, :], n_samples, axis=0)
+        has_nan = np.isnan(flat_X).any()
+
+        # Leaves point back at themselves, so a fixed number of steps is enough
+        for _ in range(self.max_depth):
+            values = flat_X[row_offsets + self.feature[node]]
+            go_left = values <= self.threshold[node]
+            if has_nan:
+                go_left = np.where(np.isnan(values), self.missing_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # Sequential accumulation in tree order, exactly like RandomForestClassifier
+        proba = np.add.accumulate(self.leaf_values[leaves], axis=1)[:, -1]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+# ----------- Threshold folding -----------
+
+def _to_ordered(values):
+    bits = values.view(np.int64)
+    return np.where(bits < 0, -(bits & _MAGNITUDE), bits)
+
+def _from_ordered(keys):
+    bits = np.where(keys < 0, (-keys) | _SIGN_BIT, keys)
+    return bits.view(np.float64)
+
+def _scaled_as_sklearn(x, mean, scale):
+    # StandardScaler.transform in float64, then the float32 cast done by the trees
+    with np.errstate(over="ignore", invalid="ignore"):
+        return ((x - mean) / scale).astype(np.float32).astype(np.float64)
+
+def fold_thresholds(threshold, mean, scale):
+    # Largest float64 x with float32((x - mean) / scale) <= threshold, per node
+    largest = np.finfo(np.float64).max
+    lo = np.full(threshold.shape, _to_ordered(np.array([-largest]))[0])
+    hi = np.full(threshold.shape, _to_ordered(np.array([largest]))[0])
+
+    none_left = _scaled_as_sklearn(_from_ordered(lo), mean, scale) > threshold
+    all_left = _scaled_as_sklearn(_from_ordered(hi), mean, scale) <= threshold
+
+    # Invariant: predicate(lo) holds, predicate(hi) does not. The keys span
+    # almost all of int64, so the midpoint is computed without overflow.
+    for _ in range(70):
+        active = hi > lo + 1
+        if not active.any():
+            break
+        mid = (lo & hi) + ((lo ^ hi) >> 1)
+        ok = _scaled_as_sklearn(_from_ordered(mid), mean, scale) <= threshold
+        lo = np.where(active & ok, mid, lo)
+        hi = np.where(active & ~ok, mid, hi)
+
+    folded = _from_ordered(lo).copy()
+    folded[none_left] = -np.inf
+    folded[all_left] = np.inf
+    return folded
+
+# ----------- Compilation -----------
+
+def _split_pipeline(model):
+    # sklearn is only needed to compile, not to serve an exported artifact
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if isinstance(model, Pipeline):
+        steps = [step for _, step in model.steps if step not in (None, "passthrough")]
+    else:
+        steps = [model]
+
+    if len(steps) == 2 and isinstance(steps[0], StandardScaler):
+        scaler, forest = steps
+    elif len(steps) == 1:
+        scaler, forest = None, steps[0]
+    else:
+        raise TypeError(f"Cannot compile {type(model).__name__}: expected [StandardScaler,] RandomForestClassifier")
+
+    if not isinstance(forest, RandomForestClassifier):
+        raise TypeError(f"Cannot compile {type(forest).__name__}: expected RandomForestClassifier")
+    if forest.n_outputs_ != 1:
+        raise TypeError("Cannot compile multi-output forests")
+    return scaler, forest
+
+def compile_pipeline(model) -> CompiledForest:
+    scaler, forest = _split_pipeline(model)
+    n_features = forest.n_features_in_
+
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    if scaler is not None:
+        if scaler.mean_ is not None:
+            mean = np.asarray(scaler.mean_, dtype=np.float64)
+        if scaler.scale_ is not None:
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.int64)
+        is_leaf = tree.children_left == -1
+
+        left = np.where(is_leaf, node_ids, tree.children_left) + offset
+        right = np.where(is_leaf, node_ids, tree.children_right) + offset
+        feature = np.where(is_leaf, 0, tree.feature)
+        threshold = np.where(is_leaf, np.inf, tree.threshold)
+        missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+
+        roots.append(offset)
+        features.append(feature)
+        thresholds.append(threshold)
+        lefts.append(left)
+        rights.append(right)
+        missing_lefts.append(np.where(is_leaf, 1, missing_left))
+        values.append(tree.value[:, 0, :forest.n_classes_])
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    feature = np.concatenate(features).astype(np.intp)
+    threshold = np.concatenate(thresholds).astype(np.float64)
+    internal = np.isfinite(threshold)
+    threshold[internal] = fold_thresholds(threshold[internal], mean[feature[internal]], scale[feature[internal]])
+
+    left = np.concatenate(lefts).astype(np.intp)
+    right = np.concatenate(rights).astype(np.intp)
+    roots = np.asarray(roots, dtype=np.intp)
+
+    return CompiledForest(
+        feature=feature,
+        threshold=threshold,
+        left=left,
+        right=right,
+        missing_left=np.concatenate(missing_lefts).astype(bool),
+        roots=roots,
+        leaf_values=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+        classes=np.asarray(forest.classes_),
+        n_features=n_features,
+        max_depth=max_depth,
+        **_build_bitvector_tables(feature, threshold, left, right, roots, n_features),
+    )
+
+def _build_bitvector_tables(feature, threshold, left, right, roots, n_features):
+    node_ids = np.arange(len(feature))
+    is_leaf = left == node_ids
+    n_trees = len(roots)
+    tree_of = np.searchsorted(roots, node_ids, side="right") - 1
+    leaves_per_tree = np.bincount(tree_of[is_leaf], minlength=n_trees)
+    n_words = int(-(-leaves_per_tree.max() // 64))
+
+    internal = np.flatnonzero(~is_leaf)
+    table_bytes = (len(internal) + n_features) * n_trees * n_words * 8
+    if table_bytes > MAX_BITVECTOR_TABLE_BYTES:
+        return {}
+
+    # Number the leaves of each tree left to right; every internal node knows
+    # the range of leaves under its left child
+    leaf_nodes = []
+    left_first = np.zeros(len(feature), dtype=np.int64)
+    left_stop = np.zeros(len(feature), dtype=np.int64)
+    for root in roots:
+        tree_leaves = []
+        first = {}
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if is_leaf[node]:
+                first[node] = len(tree_leaves)
+                tree_leaves.append(node)
+            elif children_done:
+                first[node] = first[left[node]]
+                left_first[node] = first[left[node]]
+                left_stop[node] = first[right[node]]
+            else:
+                stack.append((node, True))
+                stack.append((right[node], False))
+                stack.append((left[node], False))
+        leaf_nodes.extend(tree_leaves)
+
+    # Mask of a false split: every leaf of its tree except its left subtree
+    all_ones = np.uint64(0xFFFFFFFFFFFFFFFF)
+    word_mask = (1 << 64) - 1
+    node_masks = np.empty((len(internal), n_words), dtype=np.uint64)
+    for i, node in enumerate(internal):
+        left_bits = (1 << int(left_stop[node])) - (1 << int(left_first[node]))
+        keep = ~left_bits & ((1 << (64 * n_words)) - 1)
+        node_masks[i] = [(keep >> (64 * w)) & word_mask for w in range(n_words)]
+
+    split_thresholds, split_offsets, split_masks = [], [0], []
+    for f in range(n_features):
+        nodes = np.flatnonzero(feature[internal] == f)
+        order = nodes[np.argsort(threshold[internal][nodes], kind="stable")]
+        split_thresholds.append(threshold[internal][order])
+        split_offsets.append(split_offsets[-1] + len(order))
+
+        # prefix[k] = AND of the first k false-split masks, per tree
+        prefix = np.full((len(order) + 1, n_trees, n_words), all_ones, dtype=np.uint64)
+        current = np.full((n_trees, n_words), all_ones, dtype=np.uint64)
+        for k, i in enumerate(order, start=1):
+            tree = tree_of[internal[i]]
+            current[tree] &= node_masks[i]
+            prefix[k] = current
+        split_masks.append(prefix)
+
+    leaf_offsets = np.concatenate([[0], np.cumsum(leaves_per_tree)[:-1]]).astype(np.intp)
+    return {
+        "split_thresholds": np.concatenate(split_thresholds).astype(np.float64),
+        "split_offsets": np.asarray(split_offsets, dtype=np.intp),
+        "split_masks": np.concatenate(split_masks),
+        "leaf_nodes": np.asarray(leaf_nodes, dtype=np.intp),
+        "leaf_offsets": leaf_offsets,
+    }
+
+# ----------- Memory-mapped artifacts -----------
+
+ARTIFACT_MAGIC = b"FRDFRST1"
+ARTIFACT_ALIGNMENT = 64
+ARTIFACT_ARRAYS = [
+    "feature", "threshold", "left", "right", "missing_left", "roots", "leaf_values", "classes",
+    "split_thresholds", "split_offsets", "split_masks", "leaf_nodes", "leaf_offsets",
+]
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _artifact_array(compiled: CompiledForest, name: str):
+    value = compiled.classes_ if name == "classes" else getattr(compiled, name)
+    if value is None:
+        return None
+    value = np.asarray(value)
+    # Index arrays are stored as int64 so artifacts do not depend on the platform intp
+    if value.dtype.kind in "iu" and value.dtype != np.uint64:
+        value = value.astype("<i8")
+    return np.ascontiguousarray(value)
+
+def save_compiled(compiled: CompiledForest, path: str, source_sha256: str = None):
+    arrays = {}
+    for name in ARTIFACT_ARRAYS:
+        value = _artifact_array(compiled, name)
+        if value is not None:
+            arrays[name] = value
+
+    # Lay the arrays out after the header, each on an aligned offset
+    layout = {}
+    offset = 0
+    for name, value in arrays.items():
+        offset = -(-offset // ARTIFACT_ALIGNMENT) * ARTIFACT_ALIGNMENT
+        layout[name] = {"dtype": value.dtype.str, "shape": list(value.shape), "offset": offset}
+        offset += value.nbytes
+
+    header = {
+        "n_features": compiled.n_features_in_,
+        "max_depth": compiled.max_depth,
+        "source_sha256": source_sha256,
+        "arrays": layout,
+    }
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(ARTIFACT_MAGIC) + 8 + len(header_bytes)) // ARTIFACT_ALIGNMENT) * ARTIFACT_ALIGNMENT
+
+    # Write to a temp file and rename, so running workers never map a half-written file
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(ARTIFACT_MAGIC)
+        f.write(struct.pack("<Q", data_start))
+        f.write(header_bytes)
+        for name, value in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(value.tobytes())
+    os.replace(tmp_path, path)
+
+def read_artifact_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        if f.read(len(ARTIFACT_MAGIC)) != ARTIFACT_MAGIC:
+            raise ValueError(f"{path} is not a compiled forest artifact")
+        data_start, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(data_start - len(ARTIFACT_MAGIC) - 8).rstrip(b"\0"))
+    header["data_start"] = data_start
+    return header
+
+def load_compiled(path: str) -> CompiledForest:
+    header = read_artifact_header(path)
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Read-only views straight into the mapping; the arrays keep it alive
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=header["data_start"] + spec["offset"]
+        ).reshape(spec["shape"])
+
+    return CompiledForest(
+        n_features=header["n_features"],
+        max_depth=header["max_depth"],
+        **arrays,
+    )
+
+def export_artifact(joblib_path: str, artifact_path: str = None) -> str:
+    import joblib
+
+    artifact_path = artifact_path or os.path.splitext(joblib_path)[0] + ".forest"
+    compiled = compile_pipeline(joblib.load(joblib_path))
+    save_compiled(compiled, artifact_path, source_sha256=file_sha256(joblib_path))
+    return artifact_path
+
+# ----------- Verification / benchmark -----------
+
+def _probe_inputs(model, compiled, n_random=20000, seed=42):
+    # Random rows around the training distribution plus rows sitting exactly on
+    # (and one ulp either side of) every folded threshold
+    scaler, _ = _split_pipeline(model)
+    rng = np.random.default_rng(seed)
+    n_features = compiled.n_features_in_
+    center = scaler.mean_ if scaler is not None else np.zeros(n_features)
+    spread = scaler.scale_ if scaler is not None else np.ones(n_features)
+    X = center + rng.standard_normal((n_random, n_features)) * spread * 2
+
+    internal = np.isfinite(compiled.threshold)
+    edges = []
+    for f in range(n_features):
+        cut = compiled.threshold[internal & (compiled.feature == f)]
+        for value in (cut, np.nextafter(cut, np.inf), np.nextafter(cut, -np.inf)):
+            rows = np.repeat(center[None, :], len(value), axis=0)
+            rows[:, f] = value
+            edges.append(rows)
+    return np.vstack([X] + edges)
+
+def verify(model, compiled) -> int:
+    X = _probe_inputs(model, compiled)
+    if not np.array_equal(model.predict_proba(X), compiled.predict_proba(X)):
+        raise AssertionError("predict_proba differs from sklearn")
+    if not np.array_equal(model.predict(X), compiled.predict(X)):
+        raise AssertionError("predict differs from sklearn")
+    return len(X)
+
+def _best_of(fn, repeat):
+    import time
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import warnings
+
+    import joblib
+
+    from modelRegistry import resolve_model
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    # The models the server would load (active registry versions or legacy files)
+    MODEL_PATHS = [resolve_model(name)[0] for name in ("ovulation", "pregnancy", "childcare")]
+
+    if sys.argv[1:] == ["export"]:
+        for path in MODEL_PATHS:
+            artifact_path = export_artifact(path)
+            model = joblib.load(path)
+            checked = verify(model, load_compiled(artifact_path))
+            print(f"{path} -> {artifact_path} ({os.path.getsize(artifact_path):,} bytes, identical on {checked} rows)")
+        sys.exit(0)
+
+    for path in MODEL_PATHS:
+        model = joblib.load(path)
+        start = time.perf_counter()
+        compiled = compile_pipeline(model)
+        compile_ms = (time.perf_counter() - start) * 1000
+        checked = verify(model, compiled)
+
+        one = _probe_inputs(model, compiled, n_random=1)[:1]
+        batch = _probe_inputs(model, compiled, n_random=1000)[:1000]
+        print(f"{path}: {compiled.n_trees} trees, {compiled.node_count} nodes, compiled in {compile_ms:.0f} ms, "
+              f"identical on {checked} rows")
+        for label, X, repeat in [("1 row", one, 50), ("1000 rows", batch, 5)]:
+            sk = _best_of(lambda: model.predict_proba(X), repeat) * 1000
+            np_ = _best_of(lambda: compiled.predict_proba(X), repeat) * 1000
+            print(f"  {label:>9}: sklearn {sk:8.3f} ms   compiled {np_:8.3f} ms   ({sk / np_:.1f}x)")
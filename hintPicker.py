@@ -0,0 +1,29 @@
+# Deterministic choice of hint and message templates.
+#
+# A HintPicker stands in for random.choice: its picks are drawn from a
+# sha256 stream keyed on the record being answered and the current UTC date,
+# so identical requests on the same day get identical responses (which makes
+# them cacheable, see etags.py) while hints still rotate from day to day. No
+# state is shared between requests or threads.
+
+import hashlib
+from datetime import datetime, timezone
+
+def hint_date() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+class HintPicker:
+    # The key is made of plain values (str, numbers, None, and lists, tuples
+    # and dicts of them), whose repr is the same in every process
+    def __init__(self, *key):
+        self._seed = hashlib.sha256(f"{hint_date()}\0{key!r}".encode()).digest()
+        self._pool = self._seed
+        self._block = 0
+
+    def choice(self, options):
+        if len(self._pool) < 4:
+            self._block += 1
+            self._pool += hashlib.sha256(self._seed + self._block.to_bytes(4, "little")).digest()
+        value = int.from_bytes(self._pool[:4], "little")
+        self._pool = self._pool[4:]
+        return options[value % len(options)]
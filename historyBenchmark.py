@@ -0,0 +1,84 @@
+# Latency of the pregnancy and childcare routes versus history length.
+#
+# Both routes only look at the trailing records (tail_records in faridaAI.py),
+# so the time spent validating should not grow with the number of records the
+# client sends. For each history length this prints the median time of
+#   full  - the old parsing: every record through pydantic and .dict()
+#   tail  - the current parsing of the same body
+#   route - a whole POST through the app (JSON decoding included)
+#
+#   python historyBenchmark.py
+
+import json
+import os
+import statistics
+import time
+import warnings
+
+# Every call re-sends the same body, which single-flight (singleFlight.py)
+# would answer from its window instead of running the route; read at import
+os.environ["FARIDA_SINGLE_FLIGHT"] = "0"
+
+from fastapi.testclient import TestClient
+
+import faridaAI
+from app import app
+
+HISTORY_LENGTHS = [1, 10, 100, 1000, 10000]
+
+def pregnancy_record(i: int) -> dict:
+    return {
+        "id": i, "created_at": "2024-01-01", "pregnance_week": 10 + i % 30, "featus_number": 1,
+        "is_smoking": False, "is_drinking": False, "mental_health_problem": i % 7 == 0,
+        "symptoms": "none", "prev_pregnancy_issues": "none", "fetal_HR": 140, "mother_HR": 80,
+        "status": "active", "userID": "bench",
+    }
+
+def childcare_record(i: int) -> dict:
+    return {
+        "id": i, "created_at": "2024-01-01", "userID": "bench", "baby_age_month": i % 24,
+        "gender": "female", "birth_weight": 3.2, "current_weight": 3.2 + i * 0.01,
+        "feeding_type": "mixed", "feeding_frequency": 8, "sleep_hours": 14, "status": "active",
+    }
+
+ROUTES = [
+    ("/farida-pregnancy-api", "filteredPregnance", pregnancy_record,
+     faridaAI.PregnanceRequest, faridaAI.PregnanceHistory, faridaAI.PregnanceRecord, 1),
+    ("/farida-childcare-api", "filteredChildcare", childcare_record,
+     faridaAI.ChildcareRequest, faridaAI.ChildcareHistory, faridaAI.ChildcareRecord, 2),
+]
+
+def median_ms(fn, repeat: int) -> float:
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def full_parse(request_model, field, body):
+    return [record.dict() for record in getattr(request_model.model_validate(body), field)]
+
+def tail_parse(history_model, record_model, keep, field, body):
+    records = getattr(history_model.model_validate(body), field)
+    return faridaAI.tail_records(records, record_model, keep, (field,))
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    with TestClient(app) as client:
+        for path, field, make_record, request_model, history_model, record_model, keep in ROUTES:
+            print(path)
+            print(f"{'records':>8} {'body KB':>8} {'full ms':>9} {'tail ms':>9} {'route ms':>9}")
+            for n in HISTORY_LENGTHS:
+                body = {field: [make_record(i) for i in range(n)]}
+                raw = json.dumps(body)
+                repeat = max(5, min(200, 20000 // n))
+                full = median_ms(lambda: full_parse(request_model, field, body), repeat)
+                tail = median_ms(lambda: tail_parse(history_model, record_model, keep, field, body), repeat)
+                route = median_ms(
+                    lambda: client.post(path, content=raw, headers={"content-type": "application/json"}),
+                    repeat,
+                )
+                print(f"{n:>8} {len(raw) / 1024:>8.1f} {full:>9.3f} {tail:>9.3f} {route:>9.3f}")
+            print()
@@ -0,0 +1,118 @@
+# Dynamic micro-batching for the Farida models.
+#
+# The Farida routes are sync handlers, so FastAPI runs them on its threadpool.
+# Concurrent callers hand their single feature row to an InferenceCoalescer,
+# which waits up to `max_wait_ms` (or until `max_batch_size` rows are queued),
+# runs ONE predict/predict_proba call for all of them and gives every caller
+# its own row of the result.
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+class InferenceCoalescer:
+    def __init__(self, name: str, predict_fn: Callable, max_batch_size: int = 64, max_wait_ms: float = 0.0):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        # With no wait window (or batches of one) every call goes straight to the model
+        self.enabled = self.max_wait > 0 and self.max_batch_size > 1
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._worker = None
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._max_batch_seen = 0
+        self._bucket_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def predict(self, row: list):
+        if not self.enabled:
+            result = self.predict_fn([row])[0]
+            self._record(1)
+            return result
+        return self.submit(row).result()
+
+    def submit(self, row: list) -> Future:
+        future = Future()
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name=f"coalescer-{self.name}", daemon=True
+                )
+                self._worker.start()
+            self._pending.append((row, future))
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                # Give other callers a short window to join the batch
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+
+            self._score(batch)
+
+    def _score(self, batch: List[tuple]):
+        rows = [row for row, _ in batch]
+        try:
+            results = self.predict_fn(rows)
+        except BaseException as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+        else:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        self._record(len(batch))
+
+    def _record(self, batch_size: int):
+        bucket = len(BATCH_SIZE_BUCKETS)
+        for i, upper in enumerate(BATCH_SIZE_BUCKETS):
+            if batch_size <= upper:
+                bucket = i
+                break
+
+        with self._stats_lock:
+            self._batches += 1
+            self._rows += batch_size
+            self._max_batch_seen = max(self._max_batch_seen, batch_size)
+            self._bucket_counts[bucket] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            batches, rows = self._batches, self._rows
+            histogram = {
+                f"<={upper}": count
+                for upper, count in zip(BATCH_SIZE_BUCKETS, self._bucket_counts)
+            }
+            histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = self._bucket_counts[-1]
+            max_batch_seen = self._max_batch_seen
+
+        return {
+            "enabled": self.enabled,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": batches,
+            "rows": rows,
+            "mean_batch_size": round(rows / batches, 2) if batches else 0,
+            "max_batch_size_seen": max_batch_seen,
+            "batch_size_histogram": histogram,
+        }
@@ -0,0 +1,141 @@
+# Optional process-pool execution of Farida model predictions.
+#
+# With FARIDA_INFERENCE_PROCESSES=N (N > 0) every predict/predict_proba call
+# is sent to one of N worker processes, each of which loads the three models
+# once at start-up, so scoring no longer competes for the GIL with request
+# parsing and hint building in the server process. Feature rows travel as
+# contiguous float64 arrays, which pickle as a single raw buffer.
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+INFERENCE_PROCESSES = int(os.getenv("FARIDA_INFERENCE_PROCESSES", "0"))
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("FARIDA_INFERENCE_TIMEOUT_SECONDS", "10"))
+
+class InferenceError(Exception):
+    status_code = 500
+
+class InferenceTimeout(InferenceError):
+    status_code = 504
+
+class InferenceUnavailable(InferenceError):
+    status_code = 503
+
+# ----------- Worker side -----------
+
+_worker_models = {}
+
+def _init_worker(model_paths: dict):
+    from modelLoader import load_model, warm_up
+
+    for name, path in model_paths.items():
+        model = load_model(path)
+        warm_up(model)
+        _worker_models[name] = model
+
+def _score(name: str, method: str, X: np.ndarray):
+    return getattr(_worker_models[name], method)(X)
+
+def _ping():
+    return os.getpid()
+
+# ----------- Server side -----------
+
+class InferencePool:
+    def __init__(self, model_paths: dict, processes: int, timeout: float = INFERENCE_TIMEOUT_SECONDS):
+        self.model_paths = dict(model_paths)
+        self.processes = processes
+        self.timeout = timeout
+        self._executor = None
+        self._started = False
+        self._closed = False
+        # Pool that took over from this one in a reload (see drain)
+        self._successor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # None once the pool is shut down or drained: a closed pool never
+        # starts workers again, nothing would stop them
+        with self._lock:
+            if self._closed:
+                return None
+            if self._executor is None:
+                # spawn: never fork the threaded server process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_paths,),
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self, wait: bool = False):
+        # Start every worker (and load its models) ahead of the first request
+        if self._started:
+            return
+        self._started = True
+        executor = self._get_executor()
+        pings = [executor.submit(_ping) for _ in range(self.processes)]
+        if wait:
+            try:
+                for ping in pings:
+                    ping.result(timeout=max(self.timeout, 60))
+            except Exception as exc:
+                self.shutdown()
+                raise InferenceUnavailable(f"Inference workers failed to start: {exc}") from exc
+
+    def run(self, name: str, method: str, X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        executor = self._get_executor()
+        if executor is None:
+            # A request that picked up this pool before a reload swapped it out
+            successor = self._successor
+            if successor is not None and name in successor.model_paths:
+                return successor.run(name, method, X)
+            raise InferenceUnavailable("Inference pool is shut down")
+        try:
+            future = executor.submit(_score, name, method, X)
+        except (BrokenProcessPool, RuntimeError) as exc:
+            self._discard(executor)
+            raise InferenceUnavailable(f"Inference pool unavailable: {exc}") from exc
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as exc:
+            future.cancel()
+            raise InferenceTimeout(f"{name} {method} did not finish within {self.timeout:g}s") from exc
+        except BrokenProcessPool as exc:
+            # A worker died (e.g. OOM); the next call starts a fresh pool
+            self._discard(executor)
+            raise InferenceUnavailable(f"Inference worker crashed while scoring {name}") from exc
+        except Exception as exc:
+            raise InferenceError(f"{name} {method} failed: {type(exc).__name__}: {exc}") from exc
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._closed = True
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def drain(self, successor: "InferencePool" = None):
+        # Let submitted calls finish, then stop the workers (after a reload
+        # swap); later calls on this pool go to the successor
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._successor = successor
+            self._closed = True
+        if executor is not None:
+            threading.Thread(target=executor.shutdown, name="inference-pool-drain", daemon=True).start()
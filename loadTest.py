@@ -0,0 +1,320 @@
+# End-to-end load generator for the four POST routes.
+#
+# Request bodies follow the distributions of the training scripts
+# (ovulationTrainModel.py, pregnanceTrainModel.py, childcareTrainMOdel.py,
+# train_model.py), with configurable history lengths. N worker threads each
+# keep one HTTP connection open and send requests back to back for the given
+# duration; the report (JSON) has throughput, p50/p95/p99 latency and error
+# rates per endpoint. Bodies repeat within seconds, so single-flight
+# (singleFlight.py) is turned off in the --start-server server; against
+# another server, single_flight_hits counts the responses it served from
+# a shared computation.
+#
+#   python loadTest.py --start-server --concurrency 16 --duration 30 --output report.json
+#   python loadTest.py --url http://127.0.0.1:8000 --endpoints ovulation,budget --history 1-50
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# ----------- Payload generators -----------
+
+STRESS_LEVELS = ["low", "medium", "high"]
+GENDERS = ["male", "female"]
+FEEDING_TYPES = ["breastfeeding", "formula", "mixed"]
+EXPENSE_NAMES = ["Groceries", "Rent", "Transport", "Utilities", "Dining", "Health", "School", "Clothes"]
+
+def ovulation_body(rng: random.Random, user_id: str, history: int) -> dict:
+    # ovulationTrainModel.py: 3-10 cycles per user, age fixed per user
+    age = rng.randint(15, 45)
+    start = date(2024, 1, 1) + timedelta(days=rng.randint(0, 365))
+    records = []
+    for i in range(history):
+        cycle_length = rng.randint(24, 35)
+        records.append({
+            "name": f"user {user_id}",
+            "age": age,
+            "last_period_date": start.isoformat(),
+            "cycle_length_days": cycle_length,
+            "period_duration_days": rng.randint(3, 7),
+            "is_cycle_regular": rng.choice([True, False]),
+            "stress_level": rng.choice(STRESS_LEVELS),
+            "sleep_hours": rng.randint(4, 10),
+            "day_week_exercise": rng.randint(0, 7),
+            "diagnosed_conditions": "none",
+            "userID": user_id,
+            "status": "active",
+        })
+        start += timedelta(days=cycle_length)
+    return {"filteredOvulation": records}
+
+def pregnancy_body(rng: random.Random, user_id: str, history: int) -> dict:
+    # pregnanceTrainModel.py
+    records = []
+    for i in range(history):
+        records.append({
+            "id": i,
+            "created_at": (date(2024, 1, 1) + timedelta(days=7 * i)).isoformat(),
+            "pregnance_week": rng.randint(1, 40),
+            "featus_number": rng.choice([1, 1, 1, 2]),
+            "is_smoking": rng.choice([False, True]),
+            "is_drinking": rng.choice([False, True]),
+            "mental_health_problem": rng.choice([False, True]),
+            "symptoms": "none",
+            "prev_pregnancy_issues": "none",
+            "fetal_HR": rng.randint(110, 160) if rng.random() > 0.1 else 0,
+            "mother_HR": rng.randint(60, 100) if rng.random() > 0.1 else 0,
+            "status": "active",
+            "userID": user_id,
+        })
+    return {"filteredPregnance": records}
+
+def childcare_body(rng: random.Random, user_id: str, history: int) -> dict:
+    # childcareTrainMOdel.py
+    birth_weight = round(rng.uniform(2.0, 4.5), 2)
+    records = []
+    for i in range(history):
+        records.append({
+            "id": i,
+            "created_at": (date(2024, 1, 1) + timedelta(days=30 * i)).isoformat(),
+            "userID": user_id,
+            "baby_age_month": rng.randint(0, 24),
+            "gender": rng.choice(GENDERS),
+            "birth_weight": birth_weight,
+            "current_weight": round(birth_weight + rng.uniform(-0.5, 3.0), 2),
+            "feeding_type": rng.choice(FEEDING_TYPES),
+            "feeding_frequency": rng.randint(5, 12),
+            "sleep_hours": rng.randint(10, 18),
+            "status": "active",
+        })
+    return {"filteredChildcare": records}
+
+def budget_body(rng: random.Random, user_id: str, history: int, budgets: int = 5) -> list:
+    # train_model.py: small / medium / large budgets, spent within +-50%;
+    # `history` is the number of expenses per budget
+    items = []
+    for budget_id in range(budgets):
+        budget_range = rng.choice([(1000, 5000), (1000, 5000), (5001, 50000), (50001, 500000)])
+        budget = rng.randint(*budget_range)
+        spent = max(0, budget + rng.randint(-int(budget * 0.5), int(budget * 0.5)))
+        amounts = [rng.random() for _ in range(history)]
+        scale = spent / sum(amounts) if amounts else 0
+        items.append({
+            "budgetID": budget_id,
+            "budgetName": f"Budget {budget_id}",
+            "budgetAmount": float(budget),
+            "expenseTotal": float(spent),
+            "allExpenses": [
+                {"name": rng.choice(EXPENSE_NAMES), "amount": int(amount * scale)} for amount in amounts
+            ],
+        })
+    return items
+
+ENDPOINTS = {
+    "ovulation": ("/farida-ovulation-api", ovulation_body),
+    "pregnancy": ("/farida-pregnancy-api", pregnancy_body),
+    "childcare": ("/farida-childcare-api", childcare_body),
+    "budget": ("/predict", budget_body),
+}
+
+def build_payloads(endpoint: str, count: int, history: tuple, seed: int) -> list:
+    # Encoded up front so generating bodies is not part of the measured time
+    rng = random.Random(f"{seed}-{endpoint}")
+    _, make_body = ENDPOINTS[endpoint]
+    return [
+        json.dumps(make_body(rng, f"load-{i}", rng.randint(*history))).encode()
+        for i in range(count)
+    ]
+
+# ----------- Load driver -----------
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.single_flight_hits = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, status, single_flight_hit: bool = False):
+        with self.lock:
+            self.latencies.append(latency)
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            if status != 200:
+                self.errors += 1
+            if single_flight_hit:
+                self.single_flight_hits += 1
+
+    def report(self, elapsed: float) -> dict:
+        count = len(self.latencies)
+        latencies_ms = np.array(self.latencies) * 1000 if count else np.zeros(1)
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0,
+            "status_codes": self.statuses,
+            "single_flight_hits": self.single_flight_hits,
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0,
+            "latency_ms": {
+                "mean": round(float(latencies_ms.mean()), 3),
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "p99": round(float(p99), 3),
+                "max": round(float(latencies_ms.max()), 3),
+            },
+        }
+
+def worker(host: str, port: int, plan: list, payloads: dict, stats: dict, deadline: float, headers: dict):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    i = 0
+    while time.perf_counter() < deadline:
+        endpoint = plan[i % len(plan)]
+        body_list = payloads[endpoint]
+        body = body_list[i % len(body_list)]
+        i += 1
+
+        start = time.perf_counter()
+        hit = False
+        try:
+            conn.request("POST", ENDPOINTS[endpoint][0], body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            hit = response.getheader("X-Farida-Single-Flight") == "hit"
+        except (OSError, http.client.HTTPException) as exc:
+            status = type(exc).__name__
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+        stats[endpoint].record(time.perf_counter() - start, status, hit)
+    conn.close()
+
+def run_load(url: str, endpoints: list, weights: list, concurrency: int, duration: float,
+             history: tuple, seed: int, payload_count: int = 200) -> dict:
+    parts = urlsplit(url)
+    payloads = {endpoint: build_payloads(endpoint, payload_count, history, seed) for endpoint in endpoints}
+    stats = {endpoint: EndpointStats() for endpoint in endpoints}
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+
+    threads = []
+    start = time.perf_counter()
+    deadline = start + duration
+    for n in range(concurrency):
+        # Each worker walks its own shuffled endpoint sequence drawn by weight
+        rng = random.Random(f"{seed}-worker-{n}")
+        plan = rng.choices(endpoints, weights=weights, k=1000)
+        thread = threading.Thread(
+            target=worker, args=(parts.hostname, parts.port or 80, plan, payloads, stats, deadline, headers),
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = EndpointStats()
+    for endpoint_stats in stats.values():
+        total.latencies += endpoint_stats.latencies
+        total.errors += endpoint_stats.errors
+        total.single_flight_hits += endpoint_stats.single_flight_hits
+        for status, count in endpoint_stats.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+
+    return {
+        "config": {
+            "url": url, "endpoints": dict(zip(endpoints, weights)), "concurrency": concurrency,
+            "duration_s": duration, "history": list(history), "seed": seed,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "total": total.report(elapsed),
+        "endpoints": {endpoint: stats[endpoint].report(elapsed) for endpoint in endpoints},
+    }
+
+# ----------- Local server -----------
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int, workers: int, timeout: float = 120.0):
+    # uvicorn app:app in a child process; waits until every model is loaded
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "FARIDA_SINGLE_FLIGHT": "0"},
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/wakeUp")
+            if json.loads(conn.getresponse().read()).get("models_ready"):
+                return process
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("server did not become ready in time")
+
+def parse_range(value: str) -> tuple:
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Farida and budget routes")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-server", action="store_true", help="start app:app locally on a free port")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--endpoints", default="ovulation,pregnancy,childcare,budget")
+    parser.add_argument("--weights", default=None, help="comma separated, same order as --endpoints")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--history", type=parse_range, default=(3, 10), help="records per body, e.g. 3-10")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(",")
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    weights = [float(w) for w in args.weights.split(",")] if args.weights else [1.0] * len(endpoints)
+    if len(weights) != len(endpoints):
+        parser.error("--weights needs one value per endpoint")
+
+    server = None
+    url = args.url
+    if args.start_server:
+        port = free_port()
+        server = start_server(port, args.server_workers)
+        url = f"http://127.0.0.1:{port}"
+
+    try:
+        report = run_load(url, endpoints, weights, args.concurrency, args.duration, args.history, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
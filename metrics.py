@@ -0,0 +1,182 @@
+# Request and per-stage latency metrics in the Prometheus text format.
+#
+# Every route built with MeteredRoute counts its requests (by status), tracks
+# how many are in flight and times the whole request. Inside a handler,
+# `with stage("model"):` times one step; the durations of a request are
+# collected on a per-request timer and added to the histograms once, when the
+# request ends. Time from the start of the request to its first stage is
+# recorded as the "parse" stage (body decoding and validation) on routes that
+# take a body. Served by GET /metrics in app.py.
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.exceptions import RequestValidationError
+from starlette.requests import Request
+
+from profiling import ProfiledRoute
+
+# Upper bounds in seconds
+LATENCY_BUCKETS = [
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+]
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.label_names, labels)} {value}" for labels, value in values
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: list = LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = list(buckets)
+
+    def _series(self, labels: tuple) -> list:
+        # [per-bucket counts (+Inf last), sum, count]
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        return series
+
+    def observe(self, value: float, *labels):
+        self.observe_many([(labels, value)])
+
+    def observe_many(self, observations: list):
+        # [(labels, value), ...] under one lock acquisition
+        with self._lock:
+            for labels, value in observations:
+                series = self._series(labels)
+                series[0][bisect.bisect_left(self.buckets, value)] += 1
+                series[1] += value
+                series[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._values.items())
+        lines = self.header()
+        names = self.label_names + ("le",)
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(names, labels + (upper,))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {count}")
+        return lines
+
+REGISTRY = []
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+# ----------- Request metrics -----------
+
+REQUESTS = Counter("farida_requests_total", "Requests handled", ("route", "method", "status"))
+IN_FLIGHT = Gauge("farida_requests_in_flight", "Requests currently being handled", ("route", "method"))
+REQUEST_SECONDS = Histogram("farida_request_duration_seconds", "Request latency", ("route", "method"))
+STAGE_SECONDS = Histogram("farida_stage_duration_seconds", "Latency of one step of a request", ("route", "stage"))
+
+class RequestTimer:
+    def __init__(self, route: str, has_body: bool):
+        self.route = route
+        self.start = time.perf_counter()
+        self.stages = []
+        self.parse_pending = has_body
+
+    def add(self, name: str, seconds: float):
+        self.stages.append(((self.route, name), seconds))
+
+current_timer: ContextVar = ContextVar("current_timer", default=None)
+
+@contextmanager
+def stage(name: str):
+    timer = current_timer.get()
+    start = time.perf_counter()
+    if timer is not None and timer.parse_pending:
+        timer.parse_pending = False
+        timer.add("parse", start - timer.start)
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.add(name, time.perf_counter() - start)
+
+class MeteredRoute(ProfiledRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        method = ",".join(sorted(self.methods or ()))
+
+        async def metered_handler(request: Request):
+            timer = RequestTimer(self.path, self.body_field is not None)
+            token = current_timer.set(timer)
+            IN_FLIGHT.inc(self.path, method)
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except RequestValidationError:
+                status = 422
+                raise
+            except Exception as exc:
+                status = getattr(exc, "status_code", 500)
+                raise
+            finally:
+                elapsed = time.perf_counter() - timer.start
+                current_timer.reset(token)
+                IN_FLIGHT.dec(self.path, method)
+                REQUESTS.inc(self.path, method, status)
+                REQUEST_SECONDS.observe(elapsed, self.path, method)
+                STAGE_SECONDS.observe_many(timer.stages)
+
+        return metered_handler
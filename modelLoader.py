@@ -0,0 +1,175 @@
+# Loading of the Farida models.
+#
+# Models are wrapped in LazyModel so importing faridaAI (and therefore app.py)
+# does not wait on them: each model loads on first use, or earlier on the
+# background warm-up thread started when the server comes up. A dummy
+# prediction primes every model before it is marked ready.
+
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from forestCompiler import compile_pipeline, file_sha256, load_compiled, read_artifact_header
+
+# Serve the compiled NumPy forests instead of sklearn (set FARIDA_COMPILED_FORESTS=0 to opt out)
+USE_COMPILED_FORESTS = os.getenv("FARIDA_COMPILED_FORESTS", "1") != "0"
+# Load every model in the background as soon as the server starts (0 = only on first request)
+PRELOAD_MODELS = os.getenv("FARIDA_PRELOAD_MODELS", "1") != "0"
+
+def load_model(path: str):
+    # Prefer the memory-mapped export (python forestCompiler.py export) when it
+    # was built from this exact joblib file; otherwise unpickle and compile
+    artifact_path = os.path.splitext(path)[0] + ".forest"
+    if USE_COMPILED_FORESTS and os.path.exists(artifact_path):
+        try:
+            if read_artifact_header(artifact_path)["source_sha256"] == file_sha256(path):
+                return load_compiled(artifact_path)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    pipeline = joblib.load(path)
+    if not USE_COMPILED_FORESTS:
+        return pipeline
+    try:
+        return compile_pipeline(pipeline)
+    except TypeError:
+        # Not a StandardScaler + RandomForestClassifier pipeline, keep sklearn
+        return pipeline
+
+class ModelUnavailable(Exception):
+    pass
+
+def warm_up(model):
+    # One throwaway prediction so the first real request does not pay for it
+    row = np.zeros((1, model.n_features_in_))
+    model.predict(row)
+    model.predict_proba(row)
+
+class LazyModel:
+    def __init__(self, name: str, path: str, version: str = None):
+        self.name = name
+        self.path = path
+        # Registry version (modelRegistry.py), None for a legacy model file
+        self.version = version
+        self.state = "pending"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+        # Set to an inferencePool.InferencePool to score in worker processes
+        self.pool = None
+        self.reloads = 0
+        # Set by fail(): the model refuses to load until swap() replaces it
+        self.blocked = False
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def get(self):
+        model = self._model
+        if model is None:
+            model = self.load()
+        return model
+
+    def load(self):
+        with self._lock:
+            if self._model is not None:
+                return self._model
+            if self.blocked:
+                raise ModelUnavailable(f"{self.name} model unavailable: {self.error}")
+
+            self.state = "loading"
+            try:
+                start = time.perf_counter()
+                model = load_model(self.path)
+                loaded = time.perf_counter()
+                warm_up(model)
+                warmed = time.perf_counter()
+            except Exception as exc:
+                self.state = "failed"
+                self.error = f"{type(exc).__name__}: {exc}"
+                raise
+
+            self.load_seconds = loaded - start
+            self.warmup_seconds = warmed - loaded
+            self.error = None
+            self.state = "ready"
+            self._model = model
+            return model
+
+    def fail(self, exc: Exception):
+        # E.g. the registry artifact failed verification: never load it
+        with self._lock:
+            self.blocked = True
+            self.state = "failed"
+            self.error = f"{type(exc).__name__}: {exc}"
+
+    def prepare(self, path: str):
+        # Load and warm a replacement without touching the serving model
+        start = time.perf_counter()
+        model = load_model(path)
+        loaded = time.perf_counter()
+        warm_up(model)
+        return model, loaded - start, time.perf_counter() - loaded
+
+    def swap(self, prepared, path: str, version: str = None):
+        # Calls already running keep the model object they started with
+        model, load_seconds, warmup_seconds = prepared
+        with self._lock:
+            self._model = model
+            self.path = path
+            self.version = version
+            self.load_seconds = load_seconds
+            self.warmup_seconds = warmup_seconds
+            self.error = None
+            self.state = "ready"
+            self.blocked = False
+            self.reloads += 1
+
+    def predict(self, X):
+        if self.pool is not None:
+            return self.pool.run(self.name, "predict", X)
+        return self.get().predict(X)
+
+    def predict_proba(self, X):
+        if self.pool is not None:
+            return self.pool.run(self.name, "predict_proba", X)
+        return self.get().predict_proba(X)
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "path": self.path,
+            "version": self.version,
+            "reloads": self.reloads,
+            "load_ms": round(self.load_seconds * 1000, 2) if self.load_seconds is not None else None,
+            "warmup_ms": round(self.warmup_seconds * 1000, 2) if self.warmup_seconds is not None else None,
+            "error": self.error,
+        }
+
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+def start_background_load(models):
+    # Idempotent: the first call starts one daemon thread that loads every model
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return _warmup_thread
+
+        def load_all():
+            for model in models:
+                try:
+                    model.load()
+                except Exception:
+                    # Recorded in model.status(); the next request retries the load
+                    pass
+
+        _warmup_thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        _warmup_thread.start()
+        return _warmup_thread
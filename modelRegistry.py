@@ -0,0 +1,90 @@
+# Versioned model registry.
+#
+# python train.py writes every run to
+#   <registry>/<name>/<version>/model.joblib   the fitted pipeline
+#   <registry>/<name>/<version>/meta.json      features, rows, metrics, fit time, size, sha256
+# and points <registry>/<name>/ACTIVE at the new version. The server resolves
+# each model through resolve_model() at startup: the active version (or the
+# one pinned with FARIDA_<NAME>_MODEL_VERSION) after checking its hash, else
+# the legacy file in the repository root.
+
+import json
+import os
+
+from forestCompiler import file_sha256
+
+REGISTRY_DIR = os.getenv("FARIDA_MODEL_REGISTRY", "models")
+
+ARTIFACT_NAME = "model.joblib"
+META_NAME = "meta.json"
+ACTIVE_NAME = "ACTIVE"
+
+# Fixed filenames written by the original training scripts
+LEGACY_PATHS = {
+    "ovulation": "ovulationFaridaModel.joblib",
+    "pregnancy": "pregnancyFaridaModel.joblib",
+    "childcare": "childcareModel.joblib",
+    "budget": "model.joblib",
+}
+
+class RegistryError(Exception):
+    pass
+
+def model_dir(name: str, registry_dir: str = None) -> str:
+    return os.path.join(registry_dir or REGISTRY_DIR, name)
+
+def version_dir(name: str, version: str, registry_dir: str = None) -> str:
+    return os.path.join(model_dir(name, registry_dir), version)
+
+def read_meta(name: str, version: str, registry_dir: str = None) -> dict:
+    with open(os.path.join(version_dir(name, version, registry_dir), META_NAME)) as f:
+        return json.load(f)
+
+def list_versions(name: str, registry_dir: str = None) -> list:
+    # Metadata of every version of `name`, oldest first
+    directory = model_dir(name, registry_dir)
+    if not os.path.isdir(directory):
+        return []
+    metas = []
+    for version in os.listdir(directory):
+        if os.path.isfile(os.path.join(directory, version, META_NAME)):
+            metas.append(read_meta(name, version, registry_dir))
+    return sorted(metas, key=lambda meta: meta["created_at"])
+
+def active_version(name: str, registry_dir: str = None):
+    pinned = os.getenv(f"FARIDA_{name.upper()}_MODEL_VERSION")
+    if pinned:
+        return pinned
+    try:
+        with open(os.path.join(model_dir(name, registry_dir), ACTIVE_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def set_active(name: str, version: str, registry_dir: str = None):
+    if not os.path.isfile(os.path.join(version_dir(name, version, registry_dir), META_NAME)):
+        raise RegistryError(f"{name} has no version {version}")
+    path = os.path.join(model_dir(name, registry_dir), ACTIVE_NAME)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, path)
+
+def resolve_model(name: str, registry_dir: str = None, verify: bool = True, version: str = None):
+    # (path, version) of the model to serve (`version` instead of the active
+    # one if given); version is None for the legacy file
+    version = version or active_version(name, registry_dir)
+    if version is None:
+        return LEGACY_PATHS[name], None
+
+    path = os.path.join(version_dir(name, version, registry_dir), ARTIFACT_NAME)
+    if not verify:
+        return path, version
+    try:
+        meta = read_meta(name, version, registry_dir)
+        sha256 = file_sha256(path)
+    except (OSError, ValueError) as exc:
+        raise RegistryError(f"{name} version {version} is unreadable: {exc}") from exc
+    if sha256 != meta["sha256"]:
+        raise RegistryError(f"{name} version {version}: {ARTIFACT_NAME} does not match its recorded sha256")
+    return path, version
@@ -0,0 +1,157 @@
+# Incremental per-user ovulation features.
+#
+# ovulation_condition_features averages the user's whole cycle history, so
+# /farida-ovulation-api needs every record on every call. This store keeps the
+# running aggregates per userID in SQLite instead: integer sums for the plain
+# averages (sleep, exercise, regular cycles, stress code) and a Welford mean /
+# M2 for the cycle length standard deviation. Adding a cycle is an O(1) update
+# and the model features come straight from the stored row.
+
+import json
+import math
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import List, Optional
+
+FEATURE_STORE_PATH = os.getenv("FARIDA_FEATURE_STORE", "ovulationFeatures.sqlite3")
+
+STRESS_MAP = {"low": 0, "medium": 1, "high": 2}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ovulation_users (
+    userID TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    regular_count INTEGER NOT NULL,
+    stress_sum INTEGER NOT NULL,
+    sleep_sum INTEGER NOT NULL,
+    exercise_sum INTEGER NOT NULL,
+    cycle_mean REAL NOT NULL,
+    cycle_m2 REAL NOT NULL,
+    latest TEXT NOT NULL
+)
+"""
+
+COLUMNS = ["n", "regular_count", "stress_sum", "sleep_sum", "exercise_sum", "cycle_mean", "cycle_m2", "latest"]
+
+def empty_state() -> dict:
+    return {
+        "n": 0, "regular_count": 0, "stress_sum": 0, "sleep_sum": 0, "exercise_sum": 0,
+        "cycle_mean": 0.0, "cycle_m2": 0.0, "latest": None,
+    }
+
+def add_record(state: dict, record: dict):
+    state["n"] += 1
+    state["regular_count"] += 1 if record["is_cycle_regular"] else 0
+    state["stress_sum"] += STRESS_MAP[record["stress_level"]]
+    state["sleep_sum"] += record["sleep_hours"]
+    state["exercise_sum"] += record["day_week_exercise"]
+
+    # Welford update of the cycle length mean and sum of squared deviations
+    delta = record["cycle_length_days"] - state["cycle_mean"]
+    state["cycle_mean"] += delta / state["n"]
+    state["cycle_m2"] += delta * (record["cycle_length_days"] - state["cycle_mean"])
+    state["latest"] = record
+
+def period_start(record: dict) -> Optional[date]:
+    # "%Y-%m-%d" allows unpadded months and days, so the strings do not sort
+    # by date; None for a value that does not parse
+    try:
+        return datetime.strptime(record["last_period_date"], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+def is_new_record(state: dict, record: dict) -> bool:
+    # A retried upload must not count the same cycle twice: only records
+    # starting after the latest stored period are added. A stored date that
+    # does not parse (written before the route validated them) blocks nothing.
+    start = period_start(record)
+    if start is None:
+        return False
+    latest = state["latest"]
+    if latest is None:
+        return True
+    stored = period_start(latest)
+    return stored is None or start > stored
+
+def state_features(state: dict):
+    # Same values as faridaAI.ovulation_condition_features over the full
+    # history (None below three records, as there)
+    n = state["n"]
+    if n < 3:
+        return None
+
+    return [
+        state["latest"]["age"],
+        state["regular_count"] / n,
+        state["stress_sum"] / n,
+        state["sleep_sum"] / n,
+        state["exercise_sum"] / n,
+        math.sqrt(state["cycle_m2"] / n),
+    ]
+
+class OvulationFeatureStore:
+    def __init__(self, path: str = FEATURE_STORE_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Opened on first use; the handlers run on the threadpool, so one
+        # connection is shared behind the lock
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    def _read(self, conn, user_id: str) -> dict:
+        row = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM ovulation_users WHERE userID = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return empty_state()
+        state = dict(zip(COLUMNS, row))
+        state["latest"] = json.loads(state["latest"])
+        return state
+
+    def get(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            state = self._read(self._connection(), user_id)
+        return state if state["n"] else None
+
+    def append(self, user_id: str, records: List[dict]):
+        # Returns (state after the update, number of records added)
+        with self._lock:
+            conn = self._connection()
+            state = self._read(conn, user_id)
+            added = 0
+            for record in records:
+                if is_new_record(state, record):
+                    add_record(state, record)
+                    added += 1
+
+            if added:
+                values = [state[column] for column in COLUMNS[:-1]] + [json.dumps(state["latest"])]
+                conn.execute(
+                    f"INSERT OR REPLACE INTO ovulation_users (userID, {', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                    [user_id] + values,
+                )
+                conn.commit()
+        return state, added
+
+    def delete(self, user_id: str) -> bool:
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute("DELETE FROM ovulation_users WHERE userID = ?", (user_id,)).rowcount
+            conn.commit()
+        return deleted > 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
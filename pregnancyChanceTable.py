@@ -0,0 +1,148 @@
+# Precomputed pregnancy-chance table for /farida-ovulation-api.
+#
+# The pregnancy chance is pregnancyModel.predict_proba over seven small
+# integer features (age, regular flag, stress code, sleep hours, exercise
+# days, cycle length, period duration). Over the domain ovulationTrainModel.py
+# generates that is ~625k cells, so the build step scores every cell once and
+# stores the served value, round(chance * 100, 2), as uint16 hundredths of a
+# percent (2 bytes per cell). Serving is then an indexed lookup; features
+# outside the grid still go to the model.
+#
+#   python pregnancyChanceTable.py    build the table for the served pregnancy model
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from forestCompiler import file_sha256
+
+# (first, last) value of each feature, in pregnancy_chance_features order
+GRID_AXES = [
+    ("age", 15, 45),
+    ("is_cycle_regular", 0, 1),
+    ("stress_level", 0, 2),
+    ("sleep_hours", 4, 10),
+    ("day_week_exercise", 0, 7),
+    ("cycle_length_days", 24, 35),
+    ("period_duration_days", 3, 7),
+]
+GRID_LOW = np.array([low for _, low, _ in GRID_AXES], dtype=np.int64)
+GRID_SHAPE = tuple(high - low + 1 for _, low, high in GRID_AXES)
+BUILD_CHUNK_ROWS = 65536
+
+def table_paths(model_path: str):
+    base = os.path.splitext(model_path)[0]
+    return base + ".chance.npy", base + ".chance.json"
+
+def centi_percent(proba: np.ndarray) -> np.ndarray:
+    # round(p * 100, 2) * 100 as integers; np.round only disagrees with
+    # Python's round next to .5, so those values are redone the Python way
+    percent = proba * 100
+    rounded = np.round(percent, 2)
+    scaled = percent * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded[i] = round(float(percent[i]), 2)
+    return np.rint(rounded * 100).astype(np.uint16)
+
+def build_table(model, model_path: str) -> dict:
+    start = time.perf_counter()
+    n_cells = int(np.prod(GRID_SHAPE))
+    table = np.empty(n_cells, dtype=np.uint16)
+    for first in range(0, n_cells, BUILD_CHUNK_ROWS):
+        cells = np.arange(first, min(first + BUILD_CHUNK_ROWS, n_cells))
+        features = np.stack(np.unravel_index(cells, GRID_SHAPE), axis=1) + GRID_LOW
+        table[cells] = centi_percent(model.predict_proba(features)[:, 1])
+    build_seconds = time.perf_counter() - start
+
+    table_path, meta_path = table_paths(model_path)
+    np.save(table_path, table.reshape(GRID_SHAPE))
+    meta = {
+        "model_sha256": file_sha256(model_path),
+        "axes": GRID_AXES,
+        "cells": n_cells,
+        "bytes": int(table.nbytes),
+        "build_seconds": round(build_seconds, 3),
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+class PregnancyChanceTable:
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self._table = None
+        self._meta = None
+        self._checked = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._checked:
+                return self._table
+            table_path, meta_path = table_paths(self.model_path)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                # Only trust a table built from the model file being served
+                if meta["model_sha256"] == file_sha256(self.model_path):
+                    self._table = np.load(table_path, mmap_mode="r")
+                    self._meta = meta
+            except (OSError, ValueError, KeyError):
+                self._table = None
+            self._checked = True
+            return self._table
+
+    def reset(self):
+        # Re-check the table on next use (e.g. after the model file changed)
+        with self._lock:
+            self._table = None
+            self._meta = None
+            self._checked = False
+
+    def lookup_many(self, rows) -> np.ndarray:
+        # Percentages for rows inside the grid, NaN for the rest
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(GRID_AXES))
+        result = np.full(len(rows), np.nan)
+        table = self._table if self._checked else self._load()
+        if table is None or len(rows) == 0:
+            return result
+
+        offsets = rows - GRID_LOW
+        inside = np.all((offsets >= 0) & (offsets < GRID_SHAPE) & (offsets == np.floor(offsets)), axis=1)
+        if inside.any():
+            index = tuple(offsets[inside].astype(np.intp).T)
+            result[inside] = table[index] / 100
+        return result
+
+    def lookup(self, features: list):
+        percent = self.lookup_many([features])[0]
+        return None if np.isnan(percent) else float(percent)
+
+    def status(self) -> dict:
+        if not self._checked:
+            return {"state": "pending"}
+        if self._table is None:
+            return {"state": "unavailable"}
+        return {"state": "ready", **{k: self._meta[k] for k in ("cells", "bytes", "build_seconds")}}
+
+if __name__ == "__main__":
+    from modelLoader import load_model
+    from modelRegistry import resolve_model
+
+    MODEL_PATH, _ = resolve_model("pregnancy")
+    meta = build_table(load_model(MODEL_PATH), MODEL_PATH)
+
+    # Spot-check random cells against the model's own rounding
+    check = PregnancyChanceTable(MODEL_PATH)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(GRID_LOW, GRID_LOW + GRID_SHAPE, size=(20000, len(GRID_AXES)))
+    model = load_model(MODEL_PATH)
+    expected = [round(p * 100, 2) for p in model.predict_proba(rows)[:, 1]]
+    assert check.lookup_many(rows).tolist() == expected, "table disagrees with the model"
+
+    print(f"Pregnancy chance table: {meta['cells']:,} cells, {meta['bytes'] / 1e6:.2f} MB, "
+          f"built in {meta['build_seconds']:.2f}s")
@@ -0,0 +1,193 @@
+# Opt-in cProfile capture of single requests.
+#
+# Off unless FARIDA_PROFILING=1; when off no route or endpoint is wrapped.
+# When on, a request is profiled if it carries the X-Farida-Profile header
+# (equal to FARIDA_PROFILE_TOKEN when one is set) or falls in the sampled
+# fraction FARIDA_PROFILE_SAMPLE_RATE. The endpoint runs under cProfile in the
+# thread that executes it, the top functions by cumulative time are kept in a
+# bounded in-memory store, and the response carries X-Farida-Profile-Id.
+#
+#   GET /debug/profiles               recent captures (newest first)
+#   GET /debug/profiles/{profile_id}  one capture with its function table
+
+import asyncio
+import cProfile
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import wraps
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.routing import APIRoute
+
+PROFILING_ENABLED = os.getenv("FARIDA_PROFILING", "0") != "0"
+PROFILE_SAMPLE_RATE = float(os.getenv("FARIDA_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_STORE_SIZE = int(os.getenv("FARIDA_PROFILE_STORE_SIZE", "50"))
+PROFILE_TOP_FUNCTIONS = int(os.getenv("FARIDA_PROFILE_TOP_FUNCTIONS", "30"))
+PROFILE_TOKEN = os.getenv("FARIDA_PROFILE_TOKEN", "")
+
+PROFILE_HEADER = "x-farida-profile"
+PROFILE_ID_HEADER = "X-Farida-Profile-Id"
+
+# Sampling draws from its own generator so the global random (hints) is untouched
+_sampler = random.Random()
+
+class ProfileCapture:
+    def __init__(self, route: str, method: str, reason: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.route = route
+        self.method = method
+        self.reason = reason
+        self.profiler = cProfile.Profile()
+        self.captured = False
+
+def summarize(profiler: cProfile.Profile, top: int) -> list:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, function), (calls, primitive_calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({function})",
+            "calls": calls,
+            "primitive_calls": primitive_calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+class ProfileStore:
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: dict):
+        with self._lock:
+            self._profiles[profile["id"]] = profile
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def recent(self) -> list:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {key: value for key, value in profile.items() if key != "functions"}
+            for profile in reversed(profiles)
+        ]
+
+PROFILE_STORE = ProfileStore(PROFILE_STORE_SIZE)
+
+current_capture: ContextVar = ContextVar("current_capture", default=None)
+
+def profile_reason(request: Request):
+    header = request.headers.get(PROFILE_HEADER)
+    if header is not None and (not PROFILE_TOKEN or header == PROFILE_TOKEN):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and _sampler.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+def profiled_endpoint(endpoint):
+    # Runs the endpoint under the request's profiler, in whichever thread
+    # FastAPI calls it from (the threadpool for sync handlers)
+    if asyncio.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            capture = current_capture.get()
+            if capture is None:
+                return await endpoint(*args, **kwargs)
+            capture.captured = True
+            capture.profiler.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                capture.profiler.disable()
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        capture = current_capture.get()
+        if capture is None:
+            return endpoint(*args, **kwargs)
+        capture.captured = True
+        capture.profiler.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            capture.profiler.disable()
+    return wrapper
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        if PROFILING_ENABLED:
+            endpoint = profiled_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not PROFILING_ENABLED:
+            return handler
+        method = ",".join(sorted(self.methods or ()))
+
+        async def profiling_handler(request: Request):
+            reason = profile_reason(request)
+            if reason is None:
+                return await handler(request)
+
+            capture = ProfileCapture(self.path, method, reason)
+            token = current_capture.set(capture)
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+            finally:
+                elapsed = time.perf_counter() - start
+                current_capture.reset(token)
+                if capture.captured:
+                    PROFILE_STORE.add({
+                        "id": capture.id,
+                        "route": capture.route,
+                        "method": capture.method,
+                        "reason": capture.reason,
+                        "captured_at": time.time(),
+                        "request_ms": round(elapsed * 1000, 3),
+                        "functions": summarize(capture.profiler, PROFILE_TOP_FUNCTIONS),
+                    })
+            if capture.captured:
+                response.headers[PROFILE_ID_HEADER] = capture.id
+            return response
+
+        return profiling_handler
+
+# ----------- Debug endpoints (included by app.py when profiling is on) -----------
+
+debug_router = APIRouter()
+
+def check_token(request: Request):
+    if PROFILE_TOKEN and request.headers.get(PROFILE_HEADER) != PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="Profile token required")
+
+@debug_router.get("/debug/profiles")
+def list_profiles(request: Request):
+    check_token(request)
+    return {
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "store_size": PROFILE_STORE.max_size,
+        "profiles": PROFILE_STORE.recent(),
+    }
+
+@debug_router.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request):
+    check_token(request)
+    profile = PROFILE_STORE.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -0,0 +1,176 @@
+# Single-flight deduplication of identical Farida requests.
+#
+# The frontends often send the same request several times in a row (on
+# mount, on focus, on retry). Requests to the same route with the same
+# canonical body and the same response encoding share one computation: the
+# first one runs the handler, identical requests arriving while it runs wait
+# for it, and for FARIDA_SINGLE_FLIGHT_WINDOW_SECONDS after it finishes
+# identical requests get its response straight away. Shared responses carry
+# X-Farida-Single-Flight: hit. An error response (or exception) is shared with
+# the requests waiting on it but never kept for the window.
+#
+# Bodies are keyed on a hash of their raw bytes: a client repeating a request
+# sends the same bytes, and hashing them is far cheaper than parsing. Keying
+# happens after admission (see admission.py), so shed requests skip it.
+# Endpoints with side effects (a repeated request must run again) are marked
+# with @no_single_flight.
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from fastapi.exceptions import RequestValidationError
+from starlette.requests import Request
+from starlette.responses import Response
+
+from admission import AdmittedRoute
+from metrics import Counter, REQUESTS
+from wireFormat import accepted_format, request_format
+
+SINGLE_FLIGHT_ENABLED = os.getenv("FARIDA_SINGLE_FLIGHT", "1") != "0"
+WINDOW_SECONDS = float(os.getenv("FARIDA_SINGLE_FLIGHT_WINDOW_SECONDS", "1"))
+MAX_ENTRIES = int(os.getenv("FARIDA_SINGLE_FLIGHT_MAX_ENTRIES", "1024"))
+
+SINGLE_FLIGHT_HEADER = "X-Farida-Single-Flight"
+REQUEST_KEY = "farida.request_key"
+
+# result: "miss" (computed), "inflight" (waited on an identical request) or
+# "window" (reused a just-finished response)
+SINGLE_FLIGHT = Counter("farida_single_flight_total", "Requests by single-flight outcome", ("route", "result"))
+
+class Flight:
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.expires = None
+
+class FlightTable:
+    # Only ever touched from the event loop, so it needs no lock
+    def __init__(self, window: float, max_entries: int):
+        self.window = window
+        self.max_entries = max(1, max_entries)
+        self._flights = OrderedDict()
+
+    def get(self, key: str):
+        flight = self._flights.get(key)
+        if flight is None:
+            return None
+        expired = flight.expires is not None and flight.expires <= time.monotonic()
+        if expired or flight.future.get_loop() is not asyncio.get_running_loop():
+            del self._flights[key]
+            return None
+        return flight
+
+    def start(self, key: str) -> Flight:
+        flight = self._flights[key] = Flight()
+        self._prune()
+        return flight
+
+    def finish(self, key: str, flight: Flight, keep: bool):
+        if keep and self.window > 0:
+            flight.expires = time.monotonic() + self.window
+        elif self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _prune(self):
+        # Oldest first: drop expired flights, then finished ones over the cap
+        now = time.monotonic()
+        for key in list(self._flights):
+            flight = self._flights[key]
+            over = len(self._flights) > self.max_entries
+            if flight.expires is not None and (over or flight.expires <= now):
+                del self._flights[key]
+            elif not over:
+                break
+
+    def __len__(self):
+        return len(self._flights)
+
+FLIGHTS = FlightTable(WINDOW_SECONDS, MAX_ENTRIES)
+
+def single_flight_status() -> dict:
+    return {"enabled": SINGLE_FLIGHT_ENABLED, "window_seconds": FLIGHTS.window, "entries": len(FLIGHTS)}
+
+async def request_key(request: Request, path: str) -> str:
+    # Kept in the scope, so the layers of one request key it once
+    if REQUEST_KEY in request.scope:
+        return request.scope[REQUEST_KEY]
+    key = request.scope[REQUEST_KEY] = await body_key(request, path)
+    return key
+
+async def body_key(request: Request, path: str) -> str:
+    digest = hashlib.sha256(await request.body())
+    for part in (
+        path, request.url.query, request_format(request.headers.get("content-type", "")),
+        accepted_format(request.headers.get("accept", "")),
+    ):
+        digest.update(b"\0" + part.encode())
+    return digest.hexdigest()
+
+def copy_response(response: Response) -> Response:
+    shared = Response(content=response.body, status_code=response.status_code)
+    shared.raw_headers = [
+        header for header in response.raw_headers if header[0] != SINGLE_FLIGHT_HEADER.lower().encode()
+    ] + [(SINGLE_FLIGHT_HEADER.lower().encode(), b"hit")]
+    return shared
+
+def no_single_flight(endpoint):
+    endpoint.no_single_flight = True
+    return endpoint
+
+class SingleFlightRoute(AdmittedRoute):
+    def get_admitted_handler(self):
+        handler = super().get_admitted_handler()
+        if (
+            not SINGLE_FLIGHT_ENABLED or "POST" not in (self.methods or ()) or self.body_field is None
+            or getattr(self.endpoint, "no_single_flight", False)
+        ):
+            return handler
+        method = ",".join(sorted(self.methods))
+
+        async def single_flight_handler(request: Request):
+            key = await request_key(request, self.path)
+            flight = FLIGHTS.get(key)
+            if flight is not None:
+                result = "inflight" if not flight.future.done() else "window"
+                try:
+                    response = await asyncio.shield(flight.future)
+                except asyncio.CancelledError:
+                    if not flight.future.cancelled():
+                        raise
+                    # The request computing it went away; compute our own
+                    return await handler(request)
+                except Exception as exc:
+                    SINGLE_FLIGHT.inc(self.path, result)
+                    status = 422 if isinstance(exc, RequestValidationError) else getattr(exc, "status_code", 500)
+                    REQUESTS.inc(self.path, method, status)
+                    raise
+                SINGLE_FLIGHT.inc(self.path, result)
+                REQUESTS.inc(self.path, method, response.status_code)
+                return copy_response(response)
+
+            SINGLE_FLIGHT.inc(self.path, "miss")
+            flight = FLIGHTS.start(key)
+            try:
+                response = await handler(request)
+            except asyncio.CancelledError:
+                flight.future.cancel()
+                FLIGHTS.finish(key, flight, keep=False)
+                raise
+            except Exception as exc:
+                flight.future.set_exception(exc)
+                # Retrieved here so it is not logged when nobody was waiting
+                flight.future.exception()
+                FLIGHTS.finish(key, flight, keep=False)
+                raise
+            if not hasattr(response, "body"):
+                # Streamed: nothing to share, later callers compute their own
+                flight.future.cancel()
+                FLIGHTS.finish(key, flight, keep=False)
+                return response
+            flight.future.set_result(response)
+            FLIGHTS.finish(key, flight, keep=response.status_code < 400)
+            return response
+
+        return single_flight_handler
@@ -0,0 +1,356 @@
+# Training entry point for all four models.
+#
+# Each model is trained on syntheticData.py data in its own process. The rows
+# are split, stratified on the label, into training, validation and test sets;
+# the model is fitted on the training set, chosen on the validation set and
+# scored on the test set, which nothing before it has seen. It is written to
+# the model registry (modelRegistry.py) as a new version, which becomes the
+# active one unless --no-activate is given. Served models also get their
+# compiled .forest export (and the pregnancy model its chance table) next to
+# the joblib file.
+#
+# Instead of one default forest, every combination in SEARCH_GRID is fitted
+# (in --search-jobs threads) and scored on the validation set for accuracy and
+# F1, compiled-forest predict latency (one row and a 1000-row batch) and
+# artifact size. The Pareto frontier of those is printed and kept in
+# meta.json, and the fastest candidate whose accuracy is within
+# --accuracy-tolerance of the best one is registered (see
+# LATENCY_TIE_FRACTION); candidates that never predict the positive class
+# (F1 of 0) are passed over. --no-search fits only DEFAULT_PARAMS.
+#
+#   python train.py                               every model, default sizes
+#   python train.py ovulation pregnancy --rows 1000000 --jobs 2
+#   python train.py --accuracy-tolerance 0 --no-activate
+#   python train.py --list                        versions in the registry
+
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from modelRegistry import (
+    ARTIFACT_NAME, META_NAME, REGISTRY_DIR, active_version, list_versions, model_dir, read_meta, set_active,
+    version_dir,
+)
+from syntheticData import BUDGET_FEATURES, CHILDCARE_FEATURES, OVULATION_FEATURES, PREGNANCY_FEATURES
+
+# name: (feature columns, label column, default rows). About 10% of pregnancy
+# rows are positive, so a few hundred rows leave the validation and test sets
+# with a handful of positives at most
+MODEL_SPECS = {
+    "ovulation": (OVULATION_FEATURES, "condition_ok", 5000),
+    "pregnancy": (PREGNANCY_FEATURES, "condition_ok", 5000),
+    "childcare": (CHILDCARE_FEATURES, "condition_ok", 5000),
+    "budget": (BUDGET_FEATURES, "over_budget", 5000),
+}
+# Models the server loads, which get the serving artifacts built as well
+SERVED_MODELS = ("ovulation", "pregnancy", "childcare")
+
+# Forest hyperparameters searched per model; DEFAULT_PARAMS is what the
+# original scripts used (sklearn's defaults)
+SEARCH_GRID = {
+    "n_estimators": [10, 25, 50, 100],
+    "max_depth": [4, 8, None],
+    "min_samples_leaf": [1, 5, 20],
+}
+DEFAULT_PARAMS = {"n_estimators": 100, "max_depth": None, "min_samples_leaf": 1}
+# Rows per call when timing batched prediction
+LATENCY_BATCH_ROWS = 1000
+# Single-row latencies within this fraction of the fastest count as a tie
+# (they are mostly per-call overhead), settled by batch latency, then size
+LATENCY_TIE_FRACTION = 0.05
+
+def build_pipeline(params: dict = None):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("model", RandomForestClassifier(random_state=42, **(params or {})))
+    ])
+
+def search_candidates() -> list:
+    names = list(SEARCH_GRID)
+    return [dict(zip(names, values)) for values in itertools.product(*SEARCH_GRID.values())]
+
+def median_latencies(fns: list, calls: int, rounds: int = 5) -> list:
+    # Median seconds per call of each fn, timed round-robin so that load on
+    # the machine drifting during the measurement hits every fn alike
+    timings = [[] for _ in fns]
+    for _ in range(rounds):
+        for fn, fn_timings in zip(fns, timings):
+            for _ in range(calls):
+                start = time.perf_counter()
+                fn()
+                fn_timings.append(time.perf_counter() - start)
+    return [sorted(fn_timings)[len(fn_timings) // 2] for fn_timings in timings]
+
+def split_rows(labels, seed: int, test_fraction: float, validation_fraction: float) -> tuple:
+    # (train, validation, test) row positions, each class split in the same
+    # proportions so a rare positive class reaches every set
+    import numpy as np
+
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    splits = ([], [], [])
+    for value in np.unique(labels):
+        rows = rng.permutation(np.flatnonzero(labels == value))
+        n_test = int(round(len(rows) * test_fraction))
+        n_validation = int(round(len(rows) * validation_fraction))
+        splits[0].append(rows[n_test + n_validation:])
+        splits[1].append(rows[n_test:n_test + n_validation])
+        splits[2].append(rows[:n_test])
+    return tuple(np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.int64) for parts in splits)
+
+def measure_candidates(pipelines: list, X_validation, y_validation) -> list:
+    # Accuracy, F1, size and latency of the compiled forests, which is what
+    # the server scores with
+    import joblib
+    import numpy as np
+    from sklearn.metrics import f1_score
+
+    from forestCompiler import compile_pipeline
+
+    X = np.asarray(X_validation, dtype=np.float64)
+    y = np.asarray(y_validation)
+    one = X[:1]
+    batch = X[np.arange(LATENCY_BATCH_ROWS) % len(X)]
+    compiled = [compile_pipeline(pipeline) for pipeline in pipelines]
+
+    results = []
+    for pipeline, forest in zip(pipelines, compiled):
+        buffer = io.BytesIO()
+        joblib.dump(pipeline, buffer)
+        predicted = forest.predict(X)
+        results.append({
+            "accuracy": round(float(np.mean(predicted == y)), 4),
+            "f1": round(float(f1_score(y, predicted, zero_division=0)), 4),
+            "artifact_bytes": buffer.getbuffer().nbytes,
+            "nodes": forest.node_count,
+        })
+    single = median_latencies([lambda forest=forest: forest.predict_proba(one) for forest in compiled], 40)
+    batched = median_latencies([lambda forest=forest: forest.predict_proba(batch) for forest in compiled], 2)
+    for result, single_seconds, batch_seconds in zip(results, single, batched):
+        result["single_row_ms"] = round(single_seconds * 1000, 4)
+        result["batch_ms"] = round(batch_seconds * 1000, 3)
+    return results
+
+def pareto_front(results: list) -> list:
+    # Indices of candidates no other candidate beats on every axis
+    def dominates(a, b):
+        keys = [("accuracy", -1), ("single_row_ms", 1), ("batch_ms", 1), ("artifact_bytes", 1)]
+        no_worse = all(sign * a[key] <= sign * b[key] for key, sign in keys)
+        return no_worse and any(sign * a[key] < sign * b[key] for key, sign in keys)
+    return [i for i, b in enumerate(results) if not any(dominates(a, b) for a in results if a is not b)]
+
+def select_model(train, validation, features: list, label: str, tolerance: float, search_jobs: int):
+    # (fitted pipeline, search report) of the fastest candidate within
+    # `tolerance` of the best validation accuracy
+    candidates = search_candidates()
+
+    def fit(params):
+        return build_pipeline(params).fit(train[features], train[label])
+
+    with ThreadPoolExecutor(max_workers=search_jobs) as executor:
+        pipelines = list(executor.map(fit, candidates))
+    # Timed after all fits are done, so fitting does not skew the latencies
+    results = [
+        {"params": params, **measured}
+        for params, measured in zip(candidates, measure_candidates(pipelines, validation[features], validation[label]))
+    ]
+
+    # On imbalanced data a forest that always answers negative can have the
+    # best accuracy; it only stays in the running if every candidate does that
+    usable = [i for i, result in enumerate(results) if result["f1"] > 0] or list(range(len(results)))
+    best_accuracy = max(results[i]["accuracy"] for i in usable)
+    eligible = [i for i in usable if results[i]["accuracy"] >= best_accuracy - tolerance]
+    fastest = min(results[i]["single_row_ms"] for i in eligible)
+    tied = [i for i in eligible if results[i]["single_row_ms"] <= fastest * (1 + LATENCY_TIE_FRACTION)]
+    chosen = min(tied, key=lambda i: (
+        results[i]["batch_ms"], results[i]["artifact_bytes"], results[i]["single_row_ms"], -results[i]["accuracy"]
+    ))
+    front = pareto_front(results)
+    report = {
+        "accuracy_tolerance": tolerance,
+        "best_accuracy": best_accuracy,
+        "zero_f1_rejected": len(results) - len(usable),
+        "selected": results[chosen],
+        "pareto_front": sorted((results[i] for i in front), key=lambda result: result["single_row_ms"]),
+        "candidates": len(results),
+    }
+    return pipelines[chosen], report
+
+def print_search(name: str, report: dict):
+    print(f"{name}: {report['candidates']} candidates ({report['zero_f1_rejected']} with F1 0 passed over), "
+          f"best validation accuracy {report['best_accuracy']}, tolerance {report['accuracy_tolerance']}; "
+          f"Pareto front:")
+    for result in report["pareto_front"]:
+        marker = "*" if result == report["selected"] else " "
+        params = result["params"]
+        print(f"  {marker} trees={params['n_estimators']:<3} depth={str(params['max_depth']):<4} "
+              f"leaf={params['min_samples_leaf']:<2}  acc={result['accuracy']:.4f}  f1={result['f1']:.4f}  "
+              f"1 row={result['single_row_ms']:.3f} ms  {LATENCY_BATCH_ROWS} rows={result['batch_ms']:.2f} ms  "
+              f"{result['artifact_bytes'] / 1e6:.2f} MB")
+
+def holdout_metrics(pipeline, X, y) -> dict:
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+
+    predicted = pipeline.predict(X)
+    metrics = {
+        "accuracy": accuracy_score(y, predicted),
+        "precision": precision_score(y, predicted, zero_division=0),
+        "recall": recall_score(y, predicted, zero_division=0),
+        "f1": f1_score(y, predicted, zero_division=0),
+    }
+    if len(set(y)) > 1:
+        metrics["roc_auc"] = roc_auc_score(y, pipeline.predict_proba(X)[:, 1])
+    return {key: round(float(value), 4) for key, value in metrics.items()}
+
+def build_serving_artifacts(name: str, joblib_path: str) -> list:
+    from forestCompiler import export_artifact
+    from modelLoader import load_model
+
+    written = [export_artifact(joblib_path)]
+    if name == "pregnancy":
+        from pregnancyChanceTable import build_table, table_paths
+
+        build_table(load_model(joblib_path), joblib_path)
+        written += list(table_paths(joblib_path))
+    return [os.path.basename(path) for path in written]
+
+def train_model(name: str, rows: int, seed: int, registry_dir: str, test_fraction: float,
+                validation_fraction: float = 0.2, search: bool = True, tolerance: float = 0.005,
+                search_jobs: int = 1) -> dict:
+    import joblib
+    import sklearn
+
+    from forestCompiler import file_sha256
+    from syntheticData import generate
+
+    features, label, _ = MODEL_SPECS[name]
+
+    start = time.perf_counter()
+    df = generate(name, rows, seed=seed)
+    generate_seconds = time.perf_counter() - start
+
+    train, validation, test = (
+        df.iloc[positions] for positions in split_rows(df[label], seed, test_fraction, validation_fraction)
+    )
+
+    start = time.perf_counter()
+    report = None
+    if search and len(validation):
+        pipeline, report = select_model(train, validation, features, label, tolerance, search_jobs)
+    else:
+        pipeline = build_pipeline(DEFAULT_PARAMS).fit(train[features], train[label])
+    fit_seconds = time.perf_counter() - start
+    metrics = holdout_metrics(pipeline, test[features], test[label]) if len(test) else {}
+
+    # Written to a scratch directory and renamed once complete
+    staging = os.path.join(model_dir(name, registry_dir), f".staging-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    artifact_path = os.path.join(staging, ARTIFACT_NAME)
+    joblib.dump(pipeline, artifact_path)
+    sha256 = file_sha256(artifact_path)
+
+    created_at = datetime.now(timezone.utc)
+    version = f"{created_at:%Y%m%dT%H%M%S}-{sha256[:8]}"
+    meta = {
+        "name": name,
+        "version": version,
+        "created_at": created_at.isoformat(),
+        "features": features,
+        "label": label,
+        "training_rows": len(train),
+        "validation_rows": len(validation),
+        "holdout_rows": len(test),
+        "seed": seed,
+        "metrics": metrics,
+        "params": report["selected"]["params"] if report else DEFAULT_PARAMS,
+        "search": report,
+        "generate_seconds": round(generate_seconds, 3),
+        "fit_seconds": round(fit_seconds, 3),
+        "artifact": ARTIFACT_NAME,
+        "artifact_bytes": os.path.getsize(artifact_path),
+        "sha256": sha256,
+        "sklearn_version": sklearn.__version__,
+    }
+    if name in SERVED_MODELS:
+        meta["serving_artifacts"] = build_serving_artifacts(name, artifact_path)
+    with open(os.path.join(staging, META_NAME), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    final_dir = version_dir(name, version, registry_dir)
+    if os.path.exists(final_dir):
+        # Same artifact trained within the same second: keep the first
+        shutil.rmtree(staging)
+        return read_meta(name, version, registry_dir)
+    os.replace(staging, final_dir)
+    return meta
+
+def print_versions(names: list, registry_dir: str):
+    for name in names:
+        active = active_version(name, registry_dir)
+        print(f"{name}:")
+        for meta in list_versions(name, registry_dir):
+            marker = "*" if meta["version"] == active else " "
+            print(f"  {marker} {meta['version']}  rows={meta['training_rows']:,}  "
+                  f"fit={meta['fit_seconds']:.2f}s  {meta['metrics']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train Farida models into the model registry")
+    parser.add_argument("models", nargs="*", help=f"any of {', '.join(MODEL_SPECS)} (default: all)")
+    parser.add_argument("--rows", type=int, default=None, help="training rows (users for ovulation) per model")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--test-fraction", type=float, default=0.2, help="rows kept back for the reported metrics")
+    parser.add_argument("--validation-fraction", type=float, default=0.2,
+                        help="rows the hyperparameter search is scored on")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel training processes")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    parser.add_argument("--no-activate", action="store_true", help="register without making it active")
+    parser.add_argument("--no-search", action="store_true", help="fit only the default forest")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.005,
+                        help="validation accuracy the selected model may give up for speed")
+    parser.add_argument("--search-jobs", type=int, default=None, help="threads fitting candidates per model")
+    parser.add_argument("--list", action="store_true", help="list registered versions and exit")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.models if name not in MODEL_SPECS and name != "all"]
+    if unknown:
+        parser.error(f"unknown models: {', '.join(unknown)}")
+    names = list(MODEL_SPECS) if not args.models or "all" in args.models else list(dict.fromkeys(args.models))
+    if args.list:
+        print_versions(names, args.registry)
+        raise SystemExit(0)
+
+    for name in names:
+        os.makedirs(model_dir(name, args.registry), exist_ok=True)
+
+    jobs = args.jobs or min(len(names), os.cpu_count() or 1)
+    search_jobs = args.search_jobs or max(1, (os.cpu_count() or 1) // jobs)
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {
+            name: executor.submit(
+                train_model, name, args.rows or MODEL_SPECS[name][2], args.seed, args.registry, args.test_fraction,
+                args.validation_fraction, not args.no_search, args.accuracy_tolerance, search_jobs,
+            )
+            for name in names
+        }
+        results = {name: future.result() for name, future in futures.items()}
+
+    for name, meta in results.items():
+        if meta.get("search"):
+            print_search(name, meta["search"])
+        if not args.no_activate:
+            set_active(name, meta["version"], args.registry)
+        print(f"{name}: {meta['version']}  rows={meta['training_rows']:,}  fit={meta['fit_seconds']:.2f}s  "
+              f"{meta['artifact_bytes'] / 1e6:.2f} MB  {meta['metrics']}"
+              + ("" if args.no_activate else "  (active)"))
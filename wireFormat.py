@@ -0,0 +1,160 @@
+# Per-request wire format negotiation for the JSON routes.
+#
+# JSON stays the default. Clients can instead send
+#   Content-Type: application/msgpack                    the same schemas as MessagePack
+#   Content-Type: application/vnd.farida.columnar+msgpack  MessagePack with every
+#       history array (and a list body such as List[BudgetItem]) sent as one
+#       column per field: {"age": [...], "sleep_hours": [...], ...}
+# and ask for MessagePack responses with Accept: application/msgpack.
+#
+# Decoded bodies are handed to FastAPI as the already-parsed request body, so
+# pydantic validates the MessagePack objects directly (no JSON text in between).
+
+from contextvars import ContextVar
+from typing import Any, get_origin
+
+import msgpack
+import numpy as np
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+
+from metrics import MeteredRoute, stage
+
+JSON = "json"
+MSGPACK = "msgpack"
+COLUMNAR = "columnar"
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+COLUMNAR_MEDIA_TYPE = "application/vnd.farida.columnar+msgpack"
+REQUEST_MEDIA_TYPES = {
+    MSGPACK_MEDIA_TYPE: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    COLUMNAR_MEDIA_TYPE: COLUMNAR,
+}
+
+# Fields that hold arrays of records
+HISTORY_FIELDS = {"filteredOvulation", "filteredPregnance", "filteredChildcare", "allExpenses"}
+
+# Encoding chosen for the response of the request being handled
+response_format: ContextVar[str] = ContextVar("response_format", default=JSON)
+
+def request_format(content_type: str) -> str:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return REQUEST_MEDIA_TYPES.get(media_type, JSON)
+
+def accepted_format(accept: str) -> str:
+    # MessagePack only when the client ranks it above JSON by q-value;
+    # JSON on a tie or when neither is named
+    quality = {JSON: 0.0, MSGPACK: 0.0}
+    for part in accept.split(","):
+        media_type, *params = part.split(";")
+        media_type = media_type.strip().lower()
+        if REQUEST_MEDIA_TYPES.get(media_type) in (MSGPACK, COLUMNAR):
+            wire_format = MSGPACK
+        elif media_type in ("application/json", "application/*", "*/*"):
+            wire_format = JSON
+        else:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        quality[wire_format] = max(quality[wire_format], q)
+    return MSGPACK if quality[MSGPACK] > quality[JSON] else JSON
+
+def rows_from_columns(table):
+    # {"field": [v0, v1, ...], ...} -> [{"field": v0, ...}, ...]; anything
+    # that is not a column table is passed through for pydantic to reject
+    if not isinstance(table, dict):
+        return table
+    columns = list(table.values())
+    if not all(isinstance(column, list) for column in columns):
+        return table
+    lengths = {len(column) for column in columns}
+    if len(lengths) > 1:
+        raise RequestValidationError([{
+            "type": "columnar_length", "loc": ("body",),
+            "msg": "All columns must have the same length", "input": sorted(lengths),
+        }])
+    return [dict(zip(table.keys(), values)) for values in zip(*columns)]
+
+def expand_history_fields(value):
+    # Only walks down to the history fields; expanded rows are not revisited
+    # unless they carry nested history fields themselves (BudgetItem.allExpenses)
+    if isinstance(value, list):
+        if value and isinstance(value[0], dict) and not HISTORY_FIELDS.intersection(value[0]):
+            return value
+        return [expand_history_fields(item) for item in value]
+    if isinstance(value, dict):
+        return {
+            key: expand_history_fields(rows_from_columns(item)) if key in HISTORY_FIELDS else item
+            for key, item in value.items()
+        }
+    return value
+
+def decode_body(body: bytes, wire_format: str, list_body: bool) -> Any:
+    try:
+        data = msgpack.unpackb(body, raw=False, strict_map_key=False)
+    except (ValueError, msgpack.UnpackException):
+        raise RequestValidationError([{
+            "type": "msgpack_invalid", "loc": ("body",), "msg": "MessagePack decode error", "input": {},
+        }])
+
+    if wire_format == COLUMNAR:
+        if list_body:
+            data = rows_from_columns(data)
+        data = expand_history_fields(data)
+    return data
+
+def pack_default(value):
+    # NumPy scalars (e.g. model outputs) are not MessagePack types themselves
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__} to MessagePack")
+
+class NegotiatedResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            if response_format.get() == MSGPACK:
+                self.media_type = MSGPACK_MEDIA_TYPE
+                return msgpack.packb(content, default=pack_default, use_bin_type=True)
+            return super().render(content)
+
+class NegotiatedRoute(MeteredRoute):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        annotation = self.body_field.field_info.annotation if self.body_field is not None else None
+        self.list_body = get_origin(annotation) is list
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request):
+            token = response_format.set(accepted_format(request.headers.get("accept", "")))
+            try:
+                wire_format = request_format(request.headers.get("content-type", ""))
+                if wire_format != JSON and self.body_field is not None:
+                    request = await self.decoded_request(request, wire_format)
+                response = await handler(request)
+            finally:
+                response_format.reset(token)
+            response.headers.add_vary_header("Accept")
+            return response
+
+        return negotiated_handler
+
+    async def decoded_request(self, request: Request, wire_format: str) -> Request:
+        # Present the decoded body to FastAPI as an already-parsed JSON body
+        body = await request.body()
+        headers = [
+            (name, value) for name, value in request.scope["headers"] if name != b"content-type"
+        ] + [(b"content-type", b"application/json")]
+        decoded = Request({**request.scope, "headers": headers}, request.receive)
+        decoded._body = body
+        decoded._json = decode_body(body, wire_format, self.list_body) if body else None
+        return decoded